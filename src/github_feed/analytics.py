@@ -0,0 +1,205 @@
+import logging
+import threading
+import time
+from asyncio import to_thread
+from datetime import UTC, date, datetime
+from typing import Any
+
+import duckdb
+from pydantic import BaseModel
+
+from github_feed.sql.client import DbClient
+from github_feed.sql.models import Release, Repository, Star
+
+# The snapshot is reloaded at the latest this often, even without an invalidation
+SNAPSHOT_TTL = 300
+# Limits a query to the repos starred by a user, whose id is bound twice, or to all repos for None
+STARRED_BY_USER = "(? IS NULL OR repository.id IN (SELECT repository_id FROM star WHERE user_id = ?))"
+logger = logging.getLogger(__name__)
+
+
+class LanguageWeek(BaseModel):
+    week: date
+    language: str
+    releases: int
+
+
+class OwnerActivity(BaseModel):
+    owner: str
+    repos: int
+    releases: int
+    latest_release: datetime | None
+
+
+class ReleaseCadence(BaseModel):
+    full_name: str
+    releases: int
+    latest_release: datetime
+    median_days_between: float
+    mean_days_between: float
+
+
+class Analytics:
+    """
+    Aggregates over the starred repos and their releases, computed by DuckDB on a columnar
+    snapshot of the feed database. The snapshot is read from SQLite into Arrow on first use and
+    reloaded after invalidate(), so aggregate queries never hold up the refresh writes.
+    """
+
+    def __init__(self, db: DbClient, snapshot_ttl: float = SNAPSHOT_TTL) -> None:
+        self.db = db
+        self.snapshot_ttl = snapshot_ttl
+        self._lock = threading.Lock()
+        self._snapshot: duckdb.DuckDBPyConnection | None = None
+        self._loaded_at = 0.0
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+
+    def _load_snapshot(self) -> duckdb.DuckDBPyConnection:
+        repos = self.db.read_arrow(Repository, ["id", "full_name", "language"])
+        releases = self.db.read_arrow(Release, ["id", "repository_id", "created_at"])
+        stars = self.db.read_arrow(Star, ["user_id", "repository_id"])
+        snapshot = duckdb.connect()
+        # Timestamps are kept as naive UTC, so weeks are bucketed the same whatever the host's timezone
+        snapshot.execute("SET TimeZone = 'UTC'")
+        snapshot.register("repos_arrow", repos)
+        snapshot.register("releases_arrow", releases)
+        snapshot.register("stars_arrow", stars)
+        # Copy into DuckDB's own storage so the Arrow tables can be released
+        snapshot.execute(
+            "CREATE TABLE repository AS "
+            "SELECT id, full_name, split_part(full_name, '/', 1) AS owner, language FROM repos_arrow"
+        )
+        snapshot.execute(
+            "CREATE TABLE release AS "
+            "SELECT id, repository_id, CAST(created_at AS TIMESTAMP) AS created_at FROM releases_arrow"
+        )
+        snapshot.execute("CREATE TABLE star AS SELECT user_id, repository_id FROM stars_arrow")
+        snapshot.unregister("repos_arrow")
+        snapshot.unregister("releases_arrow")
+        snapshot.unregister("stars_arrow")
+        logger.info(
+            "Loaded analytics snapshot of %d repos, %d releases and %d stars",
+            repos.num_rows,
+            releases.num_rows,
+            stars.num_rows,
+        )
+        return snapshot
+
+    def _query(self, sql: str, parameters: list[Any]) -> list[tuple[Any, ...]]:
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._loaded_at > self.snapshot_ttl:
+                self._snapshot = self._load_snapshot()
+                self._loaded_at = time.monotonic()
+            # Each query gets its own cursor, so queries from several threads don't interfere
+            cursor = self._snapshot.cursor()
+        try:
+            return cursor.execute(sql, parameters).fetchall()
+        finally:
+            cursor.close()
+
+    def releases_per_language(self, since: datetime, user_id: int | None = None) -> list[LanguageWeek]:
+        rows = self._query(
+            f"""
+            SELECT CAST(date_trunc('week', release.created_at) AS DATE) AS week,
+                   coalesce(repository.language, 'Unknown') AS language,
+                   count(*) AS releases
+            FROM release JOIN repository ON release.repository_id = repository.id
+            WHERE release.created_at > ? AND {STARRED_BY_USER}
+            GROUP BY ALL
+            ORDER BY week, releases DESC, language
+            """,  # noqa: S608
+            [_naive_utc(since), user_id, user_id],
+        )
+        return [LanguageWeek(week=week, language=language, releases=count) for week, language, count in rows]
+
+    def most_active_owners(
+        self, since: datetime, limit: int, user_id: int | None = None
+    ) -> list[OwnerActivity]:
+        rows = self._query(
+            f"""
+            SELECT repository.owner,
+                   count(DISTINCT repository.id) AS repos,
+                   count(release.id) AS releases,
+                   max(release.created_at) AS latest_release
+            FROM repository
+            LEFT JOIN release ON release.repository_id = repository.id AND release.created_at > ?
+            WHERE {STARRED_BY_USER}
+            GROUP BY repository.owner
+            ORDER BY releases DESC, repos DESC, repository.owner
+            LIMIT ?
+            """,  # noqa: S608
+            [_naive_utc(since), user_id, user_id, limit],
+        )
+        return [
+            OwnerActivity(owner=owner, repos=repos, releases=releases, latest_release=_as_utc(latest))
+            for owner, repos, releases, latest in rows
+        ]
+
+    def release_cadence(
+        self, since: datetime, limit: int, user_id: int | None = None
+    ) -> list[ReleaseCadence]:
+        """
+        Repos with at least two releases since the given time, most frequently releasing first.
+        """
+        rows = self._query(
+            f"""
+            WITH gaps AS (
+                SELECT repository_id,
+                       created_at,
+                       epoch(created_at - lag(created_at) OVER (
+                           PARTITION BY repository_id ORDER BY created_at
+                       )) / 86400 AS days_between
+                FROM release
+                WHERE created_at > ?
+            )
+            SELECT repository.full_name,
+                   count(*) AS releases,
+                   max(gaps.created_at) AS latest_release,
+                   median(days_between) AS median_days_between,
+                   avg(days_between) AS mean_days_between
+            FROM gaps JOIN repository ON gaps.repository_id = repository.id
+            WHERE {STARRED_BY_USER}
+            GROUP BY repository.full_name
+            HAVING count(*) >= 2
+            ORDER BY median_days_between, repository.full_name
+            LIMIT ?
+            """,  # noqa: S608
+            [_naive_utc(since), user_id, user_id, limit],
+        )
+        return [
+            ReleaseCadence(
+                full_name=full_name,
+                releases=releases,
+                latest_release=latest.replace(tzinfo=UTC),
+                median_days_between=median,
+                mean_days_between=mean,
+            )
+            for full_name, releases, latest, median, mean in rows
+        ]
+
+    async def releases_per_language_async(
+        self, since: datetime, user_id: int | None = None
+    ) -> list[LanguageWeek]:
+        return await to_thread(self.releases_per_language, since, user_id)
+
+    async def most_active_owners_async(
+        self, since: datetime, limit: int, user_id: int | None = None
+    ) -> list[OwnerActivity]:
+        return await to_thread(self.most_active_owners, since, limit, user_id)
+
+    async def release_cadence_async(
+        self, since: datetime, limit: int, user_id: int | None = None
+    ) -> list[ReleaseCadence]:
+        return await to_thread(self.release_cadence, since, limit, user_id)
+
+
+def _naive_utc(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(UTC).replace(tzinfo=None)
+
+
+def _as_utc(timestamp: datetime | None) -> datetime | None:
+    return timestamp.replace(tzinfo=UTC) if timestamp is not None else None
@@ -0,0 +1,61 @@
+import logging
+from asyncio import Queue, QueueFull
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from github_feed.sql.models import Release
+
+# Batches of releases a subscriber may fall behind by before it is dropped
+DEFAULT_MAX_PENDING = 16
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, max_pending: int) -> None:
+        self._queue: Queue[list[Release] | None] = Queue(maxsize=max_pending)
+        self.dropped = False
+
+    async def get(self) -> list[Release] | None:
+        """
+        Wait for the next batch of new releases. None means the subscriber fell behind and was
+        dropped; it has to catch up from the db.
+        """
+        return await self._queue.get()
+
+    def _put(self, releases: list[Release]) -> None:
+        if self.dropped:
+            return
+        try:
+            self._queue.put_nowait(releases)
+        except QueueFull:
+            self.dropped = True
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(None)
+
+
+class ReleaseBroker:
+    """
+    In-process pub/sub of newly stored releases, for the live release stream.
+    Publishing never waits on subscribers: each one has a bounded queue of its own.
+    """
+
+    def __init__(self, max_pending: int = DEFAULT_MAX_PENDING) -> None:
+        self.max_pending = max_pending
+        self._subscriptions: set[Subscription] = set()
+
+    @contextmanager
+    def subscribe(self) -> Iterator[Subscription]:
+        subscription = Subscription(self.max_pending)
+        self._subscriptions.add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, releases: list[Release]) -> None:
+        if not releases:
+            return
+        for subscription in self._subscriptions:
+            subscription._put(releases)
+        logger.info("Published %d new releases to %d subscribers", len(releases), len(self._subscriptions))
@@ -1,20 +1,28 @@
+import asyncio
 import logging
 from collections.abc import Sequence
+from dataclasses import asdict
 from datetime import UTC, datetime, timedelta
 from functools import cache
 from os import environ, getenv
+from typing import Literal
 
-from pydantic import BaseModel, SecretStr, ValidationError
-from sqlalchemy.exc import IntegrityError, NoResultFound
+from pydantic import BaseModel, SecretStr
 
-from github_feed.github_client import GitHubClient
-from github_feed.lib import utils
-from github_feed.lib.models import Release, Repository
+from github_feed.analytics import Analytics
+from github_feed.broker import ReleaseBroker
+from github_feed.github_client import MAX_POOLED_CLIENTS, GitHubClient, GitHubClientPool, InvalidTokenError
+from github_feed.http_cache import CacheBackend, MemoryCacheBackend, SqliteCacheBackend
+from github_feed.lib.models import Release
+from github_feed.response_cache import ResponseCache
 from github_feed.sql.client import DbClient
 from github_feed.sql.models import Release as SqlRelease
+from github_feed.sql.models import ReleaseSummary, RepositorySummary, SearchResult, Star
 from github_feed.sql.models import Repository as SqlRepository
 
 DEFAULT_DB_FILENAME = "data/stargazing.db"
+DEFAULT_HTTP_CACHE_FILENAME = "data/http_cache.db"
+DEFAULT_REFRESH_INTERVAL = 900
 logger = logging.getLogger(__name__)
 
 
@@ -23,77 +31,228 @@ def get_db_client(filename: str = DEFAULT_DB_FILENAME) -> DbClient:
     return DbClient(f"sqlite:///{filename}")
 
 
-@cache
-def get_github_client(token: str) -> GitHubClient:
-    return GitHubClient(token)
+def get_cache_backend(filename: str = DEFAULT_HTTP_CACHE_FILENAME) -> CacheBackend:
+    if not filename:
+        return MemoryCacheBackend()
+    return SqliteCacheBackend(filename)
 
 
 class Config(BaseModel):
     db_filename: str = DEFAULT_DB_FILENAME
+    # SQLite file caching GitHub API results across restarts and workers, empty for a per-process cache
+    http_cache_filename: str = DEFAULT_HTTP_CACHE_FILENAME
+    # Token of the instance owner, used for the unauthenticated views and for release discovery
     github_token: SecretStr
+    # Clients kept for users who query the instance with a token of their own
+    max_clients: int = MAX_POOLED_CLIENTS
+    # Seconds between background refreshes, 0 disables them
+    refresh_interval: int = DEFAULT_REFRESH_INTERVAL
+    # Discover releases with one REST call per repo, or with batched GraphQL queries
+    release_backend: Literal["rest", "graphql"] = "rest"
+    # Pick the repos to check for releases by their pushed_at, or by ReleaseEvents in the received events feed.
+    # That feed only has events of watched repos and followed users: starring a repo does not subscribe to
+    # its events, so in events mode releases of starred repos that aren't watched are not picked up
+    change_detection: Literal["pushed_at", "events"] = "pushed_at"
 
 
 class Engine:
     def __init__(self) -> None:
         self.config: Config = self.load_config()
         self.db: DbClient = get_db_client(filename=self.config.db_filename)
-        self.gh_client: GitHubClient = get_github_client(self.config.github_token.get_secret_value())
+        self.cache_backend = get_cache_backend(self.config.http_cache_filename)
+        self.gh_client = GitHubClient(self.config.github_token.get_secret_value(), cache=self.cache_backend)
+        self.clients = GitHubClientPool(cache=self.cache_backend, max_clients=self.config.max_clients)
+        # The release fetch in flight and the start of the window it covers, shared by concurrent callers
+        self._release_fetch: tuple[datetime, asyncio.Task[list[tuple[int | None, Release]]]] | None = None
+        self.response_cache = ResponseCache()
+        self.analytics = Analytics(self.db)
+        self.release_broker = ReleaseBroker()
+        if self.config.change_detection == "events":
+            logger.warning(
+                "Change detection by events only finds releases of watched repos, not all starred ones"
+            )
         logger.info("Created new engine instance")
 
     def load_config(self) -> Config:
         db_filename = getenv("DB_FILENAME")
+        http_cache_filename = getenv("HTTP_CACHE_FILENAME")
+        refresh_interval = getenv("REFRESH_INTERVAL")
+        release_backend = getenv("RELEASE_BACKEND")
+        change_detection = getenv("CHANGE_DETECTION")
+        max_clients = getenv("MAX_CLIENTS")
         github_token = environ["GITHUB_TOKEN"]
         config_inputs = {"github_token": github_token}
 
         if db_filename is not None:
             config_inputs["db_filename"] = db_filename
+        if http_cache_filename is not None:
+            config_inputs["http_cache_filename"] = http_cache_filename
+        if refresh_interval is not None:
+            config_inputs["refresh_interval"] = refresh_interval
+        if release_backend is not None:
+            config_inputs["release_backend"] = release_backend
+        if change_detection is not None:
+            config_inputs["change_detection"] = change_detection
+        if max_clients is not None:
+            config_inputs["max_clients"] = max_clients
 
         return Config(**config_inputs)  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
 
-    async def retrieve_starred_repos(self, refresh: bool = False) -> Sequence[SqlRepository]:
+    def client_for(self, token: str | None) -> GitHubClient:
+        """
+        The client for a user's own token, or the instance owner's client without one.
+        """
+        if token is None or token == self.gh_client.token:
+            return self.gh_client
+        return self.clients.get(token)
+
+    async def user_id_for(self, token: str) -> int:
+        """
+        The GitHub user id of a token, raising InvalidTokenError if GitHub rejects it.
+        """
+        await self.clients.close_evicted()
+        try:
+            return (await self.client_for(token).get_authenticated_user()).id
+        except InvalidTokenError:
+            # Rejected tokens must not push the clients of actual users out of the pool
+            await self.clients.discard(token)
+            raise
+
+    async def close(self) -> None:
+        await self.gh_client.close()
+        await self.clients.close()
+        await self.cache_backend.close()
+
+    def _data_changed(self) -> None:
+        """
+        Drop everything derived from the db after a refresh has written new rows.
+        """
+        self.response_cache.invalidate()
+        self.analytics.invalidate()
+
+    async def last_refreshed_at(self) -> datetime | None:
+        last_run = await self.db.get_last_run_async()
+        if last_run is None:
+            return None
+        # SQLite hands datetimes back without a timezone; they are stored in UTC
+        return last_run.executed_at.replace(tzinfo=UTC)
+
+    async def refresh(self) -> None:
         """
-        Returns list of starred repositories from the db.
+        Refresh starred repos and releases from GitHub and record the run.
+        """
+        started_at = datetime.now(UTC)
+        await self.clients.close_evicted()
+        # Off the request path, so do a full star refresh to keep pushed_at current for release discovery
+        for client in [self.gh_client, *self.clients.clients()]:
+            try:
+                await self.refresh_starred_repos(full=True, client=client)
+            except Exception:
+                logger.exception("Failed to refresh the starred repositories of %s", client.name)
+        # Releases are fetched once per repo, however many users starred it
+        await self.retrieve_fresh_releases_async()
+        await self.db.store_run_async(started_at)
+        logger.info("Refresh finished in %.1fs", (datetime.now(UTC) - started_at).total_seconds())
+
+    async def refresh_periodically(self) -> None:
+        """
+        Refresh on the configured interval until cancelled. A run that happened recently, e.g. before a
+        restart, pushes back the next refresh rather than triggering one immediately.
+        """
+        interval = timedelta(seconds=self.config.refresh_interval)
+        while True:
+            last_refreshed_at = await self.last_refreshed_at()
+            if last_refreshed_at is None or datetime.now(UTC) - last_refreshed_at >= interval:
+                try:
+                    await self.refresh()
+                except Exception:
+                    logger.exception("Scheduled refresh failed")
+                wait = interval
+            else:
+                wait = interval - (datetime.now(UTC) - last_refreshed_at)
+            await asyncio.sleep(wait.total_seconds())
+
+    async def retrieve_starred_repos(
+        self,
+        refresh: bool = False,
+        full: bool = False,
+        since: str | None = None,
+        until: str | None = None,
+        limit: int | None = None,
+        cursor: tuple[str, int] | None = None,
+        client: GitHubClient | None = None,
+        user_id: int | None = None,
+    ) -> Sequence[SqlRepository]:
+        """
+        Returns list of starred repositories from the db, most recently starred first.
+        A refresh uses the given client, the instance owner's by default.
         """
         if refresh:
             logger.info("Refreshing starred repositories")
-            await self.refresh_starred_repos()
-        starred_repos = self.db.get_starred_repos()
+            await self.refresh_starred_repos(full=full, client=client)
+        starred_repos = await self.db.get_starred_repos_async(since, until, limit, cursor, user_id)
         logger.info("Retrieved %d starred repositories from the db", len(starred_repos))
         return starred_repos
 
-    async def refresh_starred_repos(self) -> None:
+    async def retrieve_starred_repo_summaries(
+        self,
+        since: str | None = None,
+        until: str | None = None,
+        limit: int | None = None,
+        cursor: tuple[str, int] | None = None,
+        user_id: int | None = None,
+    ) -> list[RepositorySummary]:
         """
-        Retrieve starred repos from GitHub and populate the database.
+        Returns the list view of starred repositories from the db, most recently starred first.
         """
-        starred_repos = await self.gh_client.get_starred_repositories_async()
-        for repo in starred_repos:
-            self._refresh_starred_repo_in_table(repo)
+        summaries = await self.db.get_starred_repo_summaries_async(since, until, limit, cursor, user_id)
+        logger.info("Retrieved %d starred repository summaries from the db", len(summaries))
+        return summaries
 
-    def _refresh_starred_repo_in_table(self, repo: Repository) -> None:
+    async def refresh_starred_repos(self, full: bool = False, client: GitHubClient | None = None) -> None:
         """
-        Inserts starred repo into table if not already present. Otherwise, the existing starred repo
-        is updated with fresh data from the GitHub API.
+        Retrieve the starred repos of the client's user, the instance owner by default, and populate
+        the database. Unless a full refresh is requested, only repos starred since the user's newest
+        star in the db are fetched. A full refresh also removes the stars of repos the user unstarred.
         """
-        raw_repo = repo.model_dump()
+        client = client if client is not None else self.gh_client
+        user = await client.get_authenticated_user()
+        since = None if full else await self.db.get_latest_starred_at_async(user.id)
+        # Each page is written as soon as it arrives, while the remaining pages are still in flight
+        upserted = 0
+        starred: set[int] = set()
         try:
-            self.db.add_repository(SqlRepository(**raw_repo))
-            logger.info("Added new starred repository to the db: %s", repo.full_name)
-        except IntegrityError:
-            # Repo already exists in the db, so try to retrieve the existing row
-            try:
-                existing_repo = self.db.get_repository(repo.id)
-            except NoResultFound:
-                # TODO: Log this error and decide how to handle it
-                logger.error("IntegrityError was raised by no existing repo found for id %s", repo.id)
-                return None
-            existing_repo = utils.update_existing_repo(existing_repo, repo)
-            self.db.update_repository(repository=existing_repo)
-            logger.info("Updated existing starred repository in the db: %s", repo.full_name)
-            return None
+            async for page in client.iter_starred_pages(since=since):
+                await self.db.upsert_repositories_async([SqlRepository(**asdict(repo)) for repo in page])
+                await self.db.upsert_stars_async(
+                    [
+                        Star(user_id=user.id, repository_id=repo.id, starred_at=repo.starred_at)
+                        for repo in page
+                    ]
+                )
+                upserted += len(page)
+                starred.update(repo.id for repo in page)
+        finally:
+            logger.info("Upserted %d starred repositories in the db", upserted)
+            if upserted:
+                self._data_changed()
+        if full:
+            # Only reached with every page listed, so a repo missing from them has been unstarred
+            unstarred = await self.db.delete_stars_except_async(user.id, starred)
+            if unstarred:
+                logger.info("Removed %d stars of %s", unstarred, client.name)
+                self._data_changed()
 
-    def retrieve_releases(self, start_time: datetime | None) -> list[SqlRelease]:
+    async def retrieve_releases_async(
+        self,
+        start_time: datetime | None,
+        end_time: datetime | None = None,
+        limit: int | None = None,
+        cursor: tuple[datetime, int] | None = None,
+        user_id: int | None = None,
+    ) -> list[SqlRelease]:
         """
-        Retrieve repositories that have been updated since the given start time.
+        Retrieve releases created since the given start time, newest first.
         If no start time is provided, a default of 3 days is used.
         """
         if start_time is None:
@@ -101,64 +260,165 @@ class Engine:
             start_time = datetime.now(UTC) - timedelta(days=3)
         logger.info("Retrieving releases since %s", start_time.isoformat())
 
-        releases = self.db.get_releases(start_time)
-        releases = list(releases)
-        releases.sort(key=lambda x: x.created_at, reverse=True)
+        releases = list(await self.db.get_releases_async(start_time, end_time, limit, cursor, user_id))
         logger.info("Retrieved %d releases from the db", len(releases))
         return releases
 
-    def retrieve_fresh_releases(self, start_time: datetime | None = None) -> list[Release]:
+    async def retrieve_release_summaries_async(
+        self,
+        start_time: datetime | None,
+        end_time: datetime | None = None,
+        limit: int | None = None,
+        cursor: tuple[datetime, int] | None = None,
+        user_id: int | None = None,
+    ) -> list[ReleaseSummary]:
         """
-        Retrieve repositories that have been updated since the given start time.
+        Retrieve the list view of releases created since the given start time, newest first.
         If no start time is provided, a default of 3 days is used.
         """
         if start_time is None:
             # Default to 3-day window
             start_time = datetime.now(UTC) - timedelta(days=3)
+        logger.info("Retrieving release summaries since %s", start_time.isoformat())
+
+        summaries = await self.db.get_release_summaries_async(start_time, end_time, limit, cursor, user_id)
+        logger.info("Retrieved %d release summaries from the db", len(summaries))
+        return summaries
+
+    async def search(
+        self,
+        query: str,
+        kinds: Sequence[Literal["repository", "release"]],
+        limit: int,
+        offset: int = 0,
+        user_id: int | None = None,
+    ) -> list[SearchResult]:
+        """
+        Search the names and descriptions of starred repos and the names and notes of their releases.
+        """
+        results = await self.db.search_async(query, kinds, limit, offset, user_id)
+        logger.info("Found %d search results for %r", len(results), query)
+        return results
+
+    async def _repos_with_new_releases(self, start_time: datetime) -> Sequence[SqlRepository]:
+        """
+        Starred repos that may have published a release since the start time.
+        """
+        if self.config.change_detection == "events":
+            clients = [self.gh_client, *self.clients.clients()]
+            results = await asyncio.gather(
+                *(client.get_release_event_repos(start_time) for client in clients), return_exceptions=True
+            )
+            # Any feed that failed or does not reach back far enough could be hiding releases
+            full_names: set[str] = set()
+            complete = True
+            for client, result in zip(clients, results, strict=True):
+                if isinstance(result, BaseException):
+                    logger.warning("Failed to read the events feed of %s: %s", client.name, result)
+                    complete = False
+                elif result is None:
+                    logger.info("Events feed of %s does not reach back to %s", client.name, start_time)
+                    complete = False
+                else:
+                    full_names |= result
+            if complete:
+                repos = await self.db.get_repos_by_full_name_async(full_names)
+                logger.info("Found %d starred repos with release events since %s", len(repos), start_time)
+                return repos
+            logger.info("Checking repos by pushed_at instead of release events")
         logger.info("Retrieving repos updated since %s", start_time.isoformat())
-        updated_repos = self.db.get_updated_repos(start_time)
+        return await self.db.get_updated_repos_async(start_time)
 
-        releases = []
+    async def _clients_for_repos(self, repos: Sequence[SqlRepository]) -> list[GitHubClient]:
+        """
+        The client to fetch each repo's releases with: the owner's if the owner starred the repo or none
+        of its stargazers has a client in the pool, otherwise that of the stargazer with the lowest id.
+        """
+        clients = self.clients.clients()
+        users = await asyncio.gather(
+            *(client.get_authenticated_user() for client in [self.gh_client, *clients]),
+            return_exceptions=True,
+        )
+        owner, *pooled = users
+        by_user = {
+            user.id: client
+            for client, user in zip(clients, pooled, strict=True)
+            if not isinstance(user, BaseException)
+        }
+        owner_id = None
+        if isinstance(owner, BaseException):
+            logger.warning("Failed to look up the instance owner: %s", owner)
+        else:
+            owner_id = owner.id
+            by_user[owner_id] = self.gh_client
+        stargazers = await self.db.get_stargazers_async([repo.id for repo in repos if repo.id is not None])
+        chosen = []
+        for repo in repos:
+            starred_by = stargazers.get(repo.id, set()) if repo.id is not None else set()
+            available = starred_by & by_user.keys()
+            if owner_id in starred_by or not available:
+                chosen.append(self.gh_client)
+            else:
+                chosen.append(by_user[min(available)])
+        return chosen
 
-        for repo in updated_repos:
-            logger.info("Retrieving releases for repo %s", repo.full_name)
-            # FIXME: This logic doesn't work if there are multiple releases within the time window as only the latest release will be returned
-            try:
-                latest_release = self.gh_client.get_latest_release(repo.releases_url)
-                if latest_release.created_at > start_time:
-                    releases.append(latest_release)
-                    self.db.add_release(SqlRelease(**latest_release.model_dump()))
-            except ValidationError as e:
-                # TODO: Log validation failure for repo
-                logger.warning(
-                    "Validation error for repo %s: %s",
-                    repo.full_name,
-                    e.errors(include_input=False, include_url=False),
-                )
-            except IntegrityError:
-                # We already have this release in the table
-                logger.info("Release %s already exists in the db", repo.full_name)
-            except Exception:
-                logger.warning("Failed to retrieve release for repo %s", repo.full_name)
+    async def _fetch_repo_releases(
+        self, client: GitHubClient, repos: Sequence[SqlRepository], start_time: datetime
+    ) -> list[list[Release] | BaseException]:
+        if self.config.release_backend == "graphql":
+            return await client.get_releases_graphql([repo.full_name for repo in repos], since=start_time)
+        return await client.get_latest_releases_async([repo.releases_url for repo in repos], since=start_time)
 
+    async def retrieve_fresh_releases_async(
+        self, start_time: datetime | None = None, user_id: int | None = None
+    ) -> list[Release]:
+        """
+        Fetch the releases of the starred repos created since the start time and store the new ones.
+        Returns the fetched releases, of the repos starred by the given user if any, newest first.
+        """
+        if start_time is None:
+            # Default to 3-day window
+            start_time = datetime.now(UTC) - timedelta(days=3)
+        fetched = await self._fetch_fresh_releases(start_time)
+        if user_id is not None:
+            starred = await self.db.get_starred_repo_ids_async(user_id)
+            fetched = [(repo_id, release) for repo_id, release in fetched if repo_id in starred]
+        releases = [release for _, release in fetched if release.created_at > start_time]
         releases.sort(key=lambda x: x.created_at, reverse=True)
         logger.info("Retrieved fresh %d releases", len(releases))
         return releases
 
-    async def retrieve_fresh_releases_async(self, start_time: datetime | None = None) -> list[Release]:
-        if start_time is None:
-            # Default to 3-day window
-            start_time = datetime.now(UTC) - timedelta(days=3)
-        logger.info("Retrieving repos updated since %s", start_time.isoformat())
-        updated_repos = self.db.get_updated_repos(start_time)
+    async def _fetch_fresh_releases(self, start_time: datetime) -> list[tuple[int | None, Release]]:
+        """
+        Fetch releases at most once at a time: a caller whose window is covered by the fetch in
+        flight waits for its result instead of fetching every repo again.
+        """
+        if self._release_fetch is not None:
+            fetch_start, task = self._release_fetch
+            if not task.done() and fetch_start <= start_time:
+                # Shielded so a caller that goes away does not cancel the fetch for the others
+                return await asyncio.shield(task)
+        task = asyncio.create_task(self._fetch_releases(start_time))
+        self._release_fetch = (start_time, task)
+        return await asyncio.shield(task)
 
-        # Fetch all releases for each updated repo asynchronously
-        urls = [repo.releases_url for repo in updated_repos]
-        all_results: list[list[Release] | BaseException] = await self.gh_client.get_latest_releases_async(
-            urls
+    async def _fetch_releases(self, start_time: datetime) -> list[tuple[int | None, Release]]:
+        updated_repos = await self._repos_with_new_releases(start_time)
+
+        # Each repo is fetched with the token of a user who starred it, which spreads requests over their
+        # rate limits and lets private repos be read at all
+        by_client: dict[GitHubClient, list[SqlRepository]] = {}
+        for repo, client in zip(updated_repos, await self._clients_for_repos(updated_repos), strict=True):
+            by_client.setdefault(client, []).append(repo)
+        groups = list(by_client.items())
+        fetched = await asyncio.gather(
+            *(self._fetch_repo_releases(client, repos, start_time) for client, repos in groups)
         )
+        grouped_repos = [repo for _, repos in groups for repo in repos]
+        all_results = [results for group_results in fetched for results in group_results]
         releases = []
-        for repo, results in zip(updated_repos, all_results, strict=True):
+        rows = []
+        for repo, results in zip(grouped_repos, all_results, strict=True):
             if isinstance(results, BaseException):
                 logger.warning("Failed to retrieve releases for repo %s: %s", repo.full_name, results)
                 continue
@@ -167,11 +427,11 @@ class Engine:
                     logger.warning("Failed to retrieve release for repo %s: %s", repo.full_name, result)
                     continue
                 if result.created_at > start_time:
-                    releases.append(result)
-                    try:
-                        self.db.add_release(SqlRelease(**result.model_dump()))
-                    except IntegrityError:
-                        logger.debug("Release %s already exists in the db", result.name)
-        releases.sort(key=lambda x: x.created_at, reverse=True)
-        logger.info("Retrieved fresh %d releases", len(releases))
+                    releases.append((repo.id, result))
+                    rows.append(SqlRelease(**result.model_dump(), repository_id=repo.id))
+        new_releases = await self.db.add_new_releases_async(rows)
+        logger.info("Stored %d new releases in the db", len(new_releases))
+        if new_releases:
+            self._data_changed()
+            self.release_broker.publish(new_releases)
         return releases
@@ -0,0 +1,77 @@
+import argparse
+import logging
+from pathlib import Path
+
+import pyarrow.parquet as pq
+from sqlmodel import SQLModel
+
+from github_feed.engine import DEFAULT_DB_FILENAME, get_db_client
+from github_feed.sql.client import DbClient
+from github_feed.sql.models import Release, Repository, Star, User
+
+# Repositories are loaded first so imported releases and stars find the repository they point to
+EXPORT_TABLES: dict[str, type[SQLModel]] = {
+    "repository": Repository,
+    "release": Release,
+    "user": User,
+    "star": Star,
+}
+# Low-cardinality string columns; every other column is left to Parquet's default plain encoding
+DICTIONARY_COLUMNS = {"language", "visibility", "default_branch", "target_commitish"}
+COMPRESSION = "zstd"
+logger = logging.getLogger(__name__)
+
+
+def export_parquet(db: DbClient, directory: Path) -> dict[str, int]:
+    """
+    Write the repository, release, user and star tables to <table>.parquet files in the directory.
+    Returns the number of rows written per table.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    counts = {}
+    for name, model in EXPORT_TABLES.items():
+        table = db.read_arrow(model)
+        pq.write_table(
+            table,
+            directory / f"{name}.parquet",
+            compression=COMPRESSION,
+            use_dictionary=[column for column in table.column_names if column in DICTIONARY_COLUMNS],
+        )
+        counts[name] = table.num_rows
+        logger.info("Exported %d rows of %s", table.num_rows, name)
+    return counts
+
+
+def import_parquet(db: DbClient, directory: Path) -> dict[str, int]:
+    """
+    Load the <table>.parquet files written by export_parquet, skipping rows that are already stored.
+    Returns the number of new rows per table.
+    """
+    counts = {}
+    for name, model in EXPORT_TABLES.items():
+        path = directory / f"{name}.parquet"
+        if not path.exists():
+            logger.warning("No export of %s found in %s", name, directory)
+            continue
+        counts[name] = db.load_arrow(model, pq.read_table(path))
+        logger.info("Imported %d new rows of %s", counts[name], name)
+    return counts
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Export or import the feed database as Parquet files.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--db", default=DEFAULT_DB_FILENAME, help="SQLite database file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    db = get_db_client(args.db)
+    if args.command == "export":
+        export_parquet(db, args.directory)
+    else:
+        import_parquet(db, args.directory)
+
+
+if __name__ == "__main__":
+    main()
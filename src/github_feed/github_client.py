@@ -1,144 +1,657 @@
+import hashlib
+import json
 import logging
-from asyncio import gather, to_thread
+import random
+import time
+from asyncio import Lock, Semaphore, as_completed, create_task, gather, sleep, to_thread
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass
 from datetime import UTC, datetime
-from typing import Any
+from email.utils import parsedate_to_datetime
+from typing import Any, NamedTuple
+from urllib.parse import parse_qs, urlsplit
 
 import aiohttp
-import urllib3
-from cachetools import TTLCache, cached
-from cashews import cache
-from multidict import CIMultiDictProxy
+from multidict import CIMultiDict, CIMultiDictProxy
+from pydantic import ConfigDict, TypeAdapter
 from urllib3.util import make_headers
 
-from github_feed.lib.models import Release, Repository, User
+from github_feed.http_cache import CacheBackend, MemoryCacheBackend
+from github_feed.lib.models import (
+    Event,
+    LinkHeader,
+    Release,
+    RepositoryRecord,
+    StarredRecord,
+)
 from github_feed.lib.utils import parse_link_header
 
 BASE_URL = "https://api.github.com"
 BASE_HEADERS = make_headers(keep_alive=True, accept_encoding=True) | {
     "X-GitHub-Api-Version": "2022-11-28",
 }
+# Includes the starred_at timestamp with every starred repository
+STARRED_MEDIA_TYPE = "application/vnd.github.star+json"
+STARRED_PER_PAGE = 100
+RELEASES_PER_PAGE = 100
+STARRED_CACHE_TTL = 120
+RELEASES_CACHE_TTL = 1200
+# Validators stay useful for as long as the resource is unchanged; the cache backend bounds their size
+CONDITIONAL_CACHE_TTL = 7 * 24 * 3600
+# GraphQL release discovery: releases requested per repository, and the release nodes one query may
+# ask for, which bounds both the query's rate limit cost and the repositories batched into it
+GRAPHQL_RELEASES_PER_REPO = 20
+GRAPHQL_NODE_BUDGET = 1000
+GRAPHQL_MAX_BATCH = 50
+# GitHub rejects connections asking for more nodes than this
+GRAPHQL_MAX_PAGE_SIZE = 100
+# The events API serves at most 300 events, 100 per page
+EVENTS_PER_PAGE = 100
+EVENTS_MAX_PAGES = 3
+DEFAULT_POLL_INTERVAL = 60
+# Clients kept for the tokens of users other than the instance owner
+MAX_POOLED_CLIENTS = 64
+# Seconds an evicted client is given to finish the requests it is serving before its session is closed
+EVICTED_CLIENT_GRACE = 60
+GRAPHQL_RELEASES_FRAGMENT = """
+fragment releases on Repository {
+  releases(first: $first, orderBy: {field: CREATED_AT, direction: DESC}) {
+    nodes {
+      databaseId id url tagName name description isDraft isPrerelease createdAt publishedAt
+      tagCommit { oid }
+    }
+  }
+}
+"""
+# Connection pool tuning for the shared aiohttp session
+CONNECTION_LIMIT = 20
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 300
+# Request scheduling defaults
+MAX_CONCURRENT_REQUESTS = 10
+MAX_RETRIES = 3
+BURST_SIZE = 500
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+RETRYABLE_STATUSES = frozenset({403, 429})
+SECONDARY_RATE_LIMIT_MESSAGE = b"secondary rate limit"
+# Rate limit resources, as named by the x-ratelimit-resource header
+CORE_RESOURCE = "core"
+GRAPHQL_RESOURCE = "graphql"
 logger = logging.getLogger(__name__)
-cache.setup("mem://")
+_starred_list_adapter = TypeAdapter(list[StarredRecord])
+_release_list_adapter = TypeAdapter(list[Release])
+_starred_page_adapter = TypeAdapter(tuple[list[RepositoryRecord], LinkHeader])
+# The start of the window a repo's releases were fetched for, and the releases
+_cached_releases_adapter = TypeAdapter(tuple[datetime | None, list[Release]])
+_event_list_adapter = TypeAdapter(list[Event])
+
+
+class InvalidTokenError(Exception):
+    """
+    GitHub rejected the token with a 401.
+    """
+
+
+class AuthenticatedUser(NamedTuple):
+    id: int
+    login: str
+
+
+class ConditionalResponse(NamedTuple):
+    status: int
+    headers: "CIMultiDictProxy[str]"
+    payload: bytes
+    etag: str | None
+    not_modified: bool
+
+
+class StoredResponse(NamedTuple):
+    """
+    Validators and payload of the last 200 response for a URL, used to issue conditional requests.
+    The Link header is kept as well, as 304s don't reliably carry it.
+    """
+
+    etag: str | None
+    last_modified: str | None
+    payload: bytes
+    link: str | None = None
+
+
+# Payloads are stored base64 encoded, as they need not be valid UTF-8
+_stored_response_adapter = TypeAdapter(
+    StoredResponse, config=ConfigDict(ser_json_bytes="base64", val_json_bytes="base64")
+)
+
+
+@dataclass(slots=True)
+class _TokenBucket:
+    """
+    Request budget of one rate limit resource.
+    """
+
+    tokens: float
+    last_refill: float
+    refill_rate: float | None = None
+    paused_until: float = 0.0
+
+    def pause(self, delay: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+
+class RequestScheduler:
+    """
+    Paces requests to the GitHub API.
+
+    Concurrency is capped with a semaphore and requests draw from a token bucket whose refill rate
+    is derived from the x-ratelimit-remaining/x-ratelimit-reset headers, so the remaining budget is
+    spread over the time left until the limit resets. GitHub budgets each rate limit resource, e.g.
+    the REST core and GraphQL limits, separately, so every resource has its own bucket. Rate limited
+    responses (403/429) put the requests of their resource on hold for the Retry-After period, the
+    reset time, or an exponential backoff with jitter.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+        max_retries: int = MAX_RETRIES,
+        burst_size: int = BURST_SIZE,
+        backoff_base: float = BACKOFF_BASE,
+    ) -> None:
+        self.max_retries = max_retries
+        self.burst_size = burst_size
+        self.backoff_base = backoff_base
+        self._semaphore = Semaphore(max_concurrency)
+        self._lock = Lock()
+        self._buckets: dict[str, _TokenBucket] = {}
+
+    @asynccontextmanager
+    async def slot(self, resource: str = CORE_RESOURCE) -> AsyncIterator[None]:
+        async with self._semaphore:
+            await self._acquire_token(resource)
+            yield
+
+    def _bucket(self, resource: str) -> _TokenBucket:
+        bucket = self._buckets.get(resource)
+        if bucket is None:
+            bucket = self._buckets[resource] = _TokenBucket(float(self.burst_size), time.monotonic())
+        return bucket
+
+    async def _acquire_token(self, resource: str) -> None:
+        async with self._lock:
+            bucket = self._bucket(resource)
+            now = time.monotonic()
+            if bucket.refill_rate is not None:
+                bucket.tokens = min(
+                    float(self.burst_size), bucket.tokens + (now - bucket.last_refill) * bucket.refill_rate
+                )
+            bucket.last_refill = now
+            delay = max(0.0, bucket.paused_until - now)
+            if bucket.tokens < 1 and bucket.refill_rate:
+                delay = max(delay, (1 - bucket.tokens) / bucket.refill_rate)
+            bucket.tokens -= 1
+        if delay > 0:
+            logger.info("Pacing GitHub %s request for %.2fs", resource, delay)
+            await sleep(delay)
+
+    def update(self, headers: "CIMultiDictProxy[str]", resource: str = CORE_RESOURCE) -> None:
+        """
+        Adjust the token bucket of the resource reported by a response to its rate limit.
+        """
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset")
+        if remaining is None or reset is None:
+            return
+        bucket = self._bucket(headers.get("x-ratelimit-resource", resource))
+        seconds_to_reset = max(1.0, int(reset) - time.time())
+        bucket.refill_rate = int(remaining) / seconds_to_reset
+        bucket.tokens = min(bucket.tokens, float(remaining))
+        if int(remaining) == 0:
+            bucket.pause(seconds_to_reset)
+
+    def retry_delay(
+        self,
+        status: int,
+        headers: "CIMultiDictProxy[str]",
+        payload: bytes,
+        attempt: int,
+        resource: str = CORE_RESOURCE,
+    ) -> float | None:
+        """
+        Return how long to wait before retrying a response, or None if it should not be retried.
+        """
+        if status not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+            return None
+        exhausted = headers.get("x-ratelimit-remaining") == "0"
+        # Every response carries rate limit headers, so a 403 is only a rate limit when it says so;
+        # otherwise it is a permissions problem, e.g. a SAML-protected or blocked repo
+        if status == 403 and not (
+            exhausted or "retry-after" in headers or SECONDARY_RATE_LIMIT_MESSAGE in payload.lower()
+        ):
+            return None
+        retry_after = _retry_after_seconds(headers["retry-after"]) if "retry-after" in headers else None
+        if retry_after is not None:
+            delay = retry_after
+        elif exhausted and "x-ratelimit-reset" in headers:
+            delay = max(0.0, int(headers["x-ratelimit-reset"]) - time.time())
+        else:
+            delay = min(BACKOFF_MAX, self.backoff_base * 2**attempt)
+        delay += random.uniform(0, self.backoff_base)  # noqa: S311
+        self._bucket(headers.get("x-ratelimit-resource", resource)).pause(delay)
+        return delay
 
 
 class GitHubClient:
-    def __init__(self, token: str) -> None:
+    def __init__(
+        self,
+        token: str,
+        base_url: str = BASE_URL,
+        connection_limit: int = CONNECTION_LIMIT,
+        scheduler: RequestScheduler | None = None,
+        cache: CacheBackend | None = None,
+    ) -> None:
         self.token = token
-        self.http = urllib3.PoolManager(
-            maxsize=10,
-            headers=BASE_HEADERS | {"Authorization": f"Bearer {self.token}"},
-        )
+        self.cache = cache if cache is not None else MemoryCacheBackend()
+        # Starred pages and ETags depend on the token, so their cache keys are scoped to it
+        self._token_key = _token_key(token)
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.base_url = base_url
+        self.connection_limit = connection_limit
+        self._session: aiohttp.ClientSession | None = None
+        # Validated models keyed by URL and tagged with the ETag they were parsed from,
+        # so a 304 can hand them back without running them through pydantic again.
+        self._validated_repos: dict[str, tuple[str, list[RepositoryRecord]]] = {}
+        self._validated_releases: dict[str, tuple[str, list[Release]]] = {}
+        self._user: AuthenticatedUser | None = None
+        self._events_poll_after = 0.0
+        self._release_events: list[Event] | None = None
 
-    def get_user(self) -> User:
-        url = f"{BASE_URL}/user"
-        resp = self.http.request("GET", url)
-        return User.model_validate_json(resp.data.decode())
-
-    @cached(cache=TTLCache(maxsize=1, ttl=300))
-    def get_starred_repositories(self) -> list[Repository]:
-        starred_repos: list[Repository] = []
-        url = f"{BASE_URL}/user/starred"
-        resp = self.http.request("GET", url)
-        logger.info("%s - %s", url, resp.status)
-        unprocessed_responses: list[Any] = []
-        if resp.status != 200:
-            logger.error("Failed to retrieve starred repositories. Non-200 status returned: %s", resp.status)
-            raise Exception("Failed to retrieve starred repositories")
-        unprocessed_responses.append(resp.json())
-
-        # Extract link header to get URL for next page
-        link_header = parse_link_header(resp.headers)
-        while link_header.next is not None:
-            # Retrieve next page of results
-            next_resp = self.http.request("GET", link_header.next)
-            logger.info("PAGINATION! %s - %s", link_header.next, next_resp.status)
-            unprocessed_responses.append(next_resp.json())
-            # Update link_header before next iteration of while-loop
-            link_header = parse_link_header(next_resp.headers)
-
-        # Process all unprocessed responses after fetching all pages
-        for response in unprocessed_responses:
-            starred_repos.extend([Repository.model_validate(repo) for repo in response])
-
-        return starred_repos
-
-    @cache(ttl="2m", key="{url}")
-    async def _get_starred_repositories(
-        self, url: str, session: aiohttp.ClientSession, max_pages: int
-    ) -> list[dict[str, Any]]:
-        await to_thread(logger.info, "Fetching starred repos from %s", url)
-        async with session.get(url) as resp:
-            self._log_rate_limit(resp.headers, sampled=True)
-            if resp.status == 404:
-                raise Exception(f"No releases found: {url}")
-            elif resp.status != 200:
-                raise Exception(f"Failed to retrieve starred repos. Non-200 status returned for: {url}")
-
-            if url.endswith(f"?page={max_pages}"):
-                link_header = parse_link_header(resp.headers)  # type: ignore[arg-type]
-                if link_header.next is not None:
-                    logger.warning(
-                        "Expected to reach the last page (%d), but found a next link: %s",
-                        max_pages,
-                        link_header.next,
-                    )
-                else:
-                    logger.info("Reached the last page (%d) of starred repositories", max_pages)
-
-            return await resp.json()  # type: ignore[no-any-return]
-
-    async def get_starred_repositories_async(self) -> list[Repository]:
-        url = f"{BASE_URL}/user/starred"
-        max_pages = 16
-        urls = [f"{url}?page={page}" for page in range(2, max_pages + 1)]
-        urls.insert(0, url)
-        async with aiohttp.ClientSession(
-            headers=BASE_HEADERS | {"Authorization": f"Bearer {self.token}"}
-        ) as session:
-            responses = await gather(
-                *[self._get_starred_repositories(url, session, max_pages) for url in urls],
-                return_exceptions=True,
+    @property
+    def name(self) -> str:
+        """
+        The login of the token's user once known, for log messages.
+        """
+        return self._user.login if self._user is not None else f"token {self._token_key}"
+
+    async def open(self) -> aiohttp.ClientSession:
+        """
+        Return the shared aiohttp session, creating it on first use.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=DNS_CACHE_TTL,
             )
-            starred_repos = []
-            for resp in responses:
-                if isinstance(resp, BaseException):
-                    logger.error("Error fetching starred repositories: %s", resp)
+            self._session = aiohttp.ClientSession(
+                headers=BASE_HEADERS | {"Authorization": f"Bearer {self.token}"},
+                connector=connector,
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _conditional_get(self, url: str, headers: dict[str, str] | None = None) -> ConditionalResponse:
+        """
+        GET the url, sending If-None-Match/If-Modified-Since from the validators kept in the cache.
+        A 304 is answered with the previously stored payload.
+        """
+        key = f"conditional:{self._token_key}:{url}"
+        cached = await self.cache.get(key)
+        entry = _stored_response_adapter.validate_json(cached) if cached is not None else None
+        headers = dict(headers or {})
+        if entry is not None:
+            if entry.etag is not None:
+                headers["If-None-Match"] = entry.etag
+            elif entry.last_modified is not None:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        status, resp_headers, payload = await self._request(url, headers)
+        if status == 304 and entry is not None:
+            logger.debug("Not modified: %s", url)
+            if entry.link is not None and "link" not in resp_headers:
+                # Paging follows the Link header, which has to describe the stored payload
+                with_link = CIMultiDict(resp_headers)
+                with_link["Link"] = entry.link
+                resp_headers = CIMultiDictProxy(with_link)
+            return ConditionalResponse(200, resp_headers, entry.payload, entry.etag, not_modified=True)
+
+        etag = resp_headers.get("etag")
+        last_modified = resp_headers.get("last-modified")
+        if status == 200 and (etag is not None or last_modified is not None):
+            entry = StoredResponse(etag, last_modified, payload, resp_headers.get("link"))
+            await self.cache.set(key, _stored_response_adapter.dump_json(entry), CONDITIONAL_CACHE_TTL)
+        return ConditionalResponse(status, resp_headers, payload, etag, not_modified=False)
+
+    async def _request(
+        self, url: str, headers: dict[str, str], method: str = "GET", body: Any = None
+    ) -> tuple[int, "CIMultiDictProxy[str]", bytes]:
+        """
+        Send the request through the request scheduler, retrying rate limited responses.
+        """
+        resource = GRAPHQL_RESOURCE if url == f"{self.base_url}/graphql" else CORE_RESOURCE
+        session = await self.open()
+        attempt = 0
+        while True:
+            async with (
+                self.scheduler.slot(resource),
+                session.request(method, url, headers=headers, json=body) as resp,
+            ):
+                self._log_rate_limit(resp.headers, sampled=True)
+                self.scheduler.update(resp.headers, resource)
+                payload = await resp.read()
+                delay = self.scheduler.retry_delay(resp.status, resp.headers, payload, attempt, resource)
+                if delay is None:
+                    return resp.status, resp.headers, payload
+            # The scheduler holds back every request until the delay has passed
+            logger.warning("Rate limited by %s (status %s), retrying in %.1fs", url, resp.status, delay)
+            attempt += 1
+
+    async def _get_starred_page(self, url: str) -> tuple[list[RepositoryRecord], LinkHeader]:
+        key = f"starred:{self._token_key}:{url}"
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return _starred_page_adapter.validate_json(cached)
+        page = await self._fetch_starred_page(url)
+        await self.cache.set(key, _starred_page_adapter.dump_json(page), STARRED_CACHE_TTL)
+        return page
+
+    async def _fetch_starred_page(self, url: str) -> tuple[list[RepositoryRecord], LinkHeader]:
+        await to_thread(logger.info, "Fetching starred repos from %s", url)
+        resp = await self._conditional_get(url, headers={"Accept": STARRED_MEDIA_TYPE})
+        if resp.status != 200:
+            raise Exception(f"Failed to retrieve starred repos. Non-200 status returned for: {url}")
+        link_header = parse_link_header(resp.headers)  # type: ignore[arg-type]
+
+        validated = self._validated_repos.get(url)
+        if resp.not_modified and validated is not None and validated[0] == resp.etag:
+            return validated[1], link_header
+        repos = []
+        for starred in _starred_list_adapter.validate_json(resp.payload):
+            starred.repo.starred_at = starred.starred_at
+            repos.append(starred.repo)
+        if resp.etag is not None:
+            self._validated_repos[url] = (resp.etag, repos)
+        return repos, link_header
+
+    async def get_starred_repositories_async(self, since: str | None = None) -> list[RepositoryRecord]:
+        """
+        Retrieve starred repositories, most recently starred first.
+        See iter_starred_pages for how since limits the pages fetched.
+        """
+        return [repo async for page in self.iter_starred_pages(since) for repo in page]
+
+    async def iter_starred_pages(self, since: str | None = None) -> AsyncIterator[list[RepositoryRecord]]:
+        """
+        Yield pages of starred repositories as soon as each one has been fetched and validated.
+
+        When since is given, only repositories starred after that timestamp are yielded and paging
+        stops at the first page that reaches it. Otherwise every page is fetched concurrently, using
+        the rel="last" link of the first page to determine how many there are, and pages are yielded
+        in the order they complete; if any page failed, an exception is raised once the others have
+        been yielded, so callers can tell the listing is incomplete.
+        """
+        url = f"{self.base_url}/user/starred?sort=created&direction=desc&per_page={STARRED_PER_PAGE}"
+        try:
+            page_repos, link_header = await self._get_starred_page(url)
+        except Exception as e:
+            if since is None:
+                raise
+            logger.error("Error fetching starred repositories: %s", e)
+            return
+
+        pages = (
+            self._iter_starred_pages_since(page_repos, link_header, since)
+            if since is not None
+            else self._iter_remaining_starred_pages(url, page_repos, link_header)
+        )
+        # Closed along with this generator, which cancels the page requests still in flight
+        async with aclosing(pages):
+            async for page in pages:
+                yield page
+
+    async def _iter_starred_pages_since(
+        self, page_repos: list[RepositoryRecord], link_header: LinkHeader, since: str
+    ) -> AsyncGenerator[list[RepositoryRecord]]:
+        found = 0
+        while True:
+            new_repos = [repo for repo in page_repos if repo.starred_at and repo.starred_at > since]
+            found += len(new_repos)
+            if new_repos:
+                yield new_repos
+            if len(new_repos) < len(page_repos) or link_header.next is None:
+                break
+            try:
+                page_repos, link_header = await self._get_starred_page(link_header.next)
+            except Exception as e:
+                logger.error("Error fetching starred repositories: %s", e)
+                break
+        logger.info("Found %d repositories starred since %s", found, since)
+
+    async def _iter_remaining_starred_pages(
+        self, url: str, page_repos: list[RepositoryRecord], link_header: LinkHeader
+    ) -> AsyncGenerator[list[RepositoryRecord]]:
+        last_page = _page_number(link_header.last) if link_header.last is not None else 1
+        tasks = [
+            create_task(self._get_starred_page(f"{url}&page={page}")) for page in range(2, last_page + 1)
+        ]
+        failed = 0
+        try:
+            yield page_repos
+            for next_page in as_completed(tasks):
+                try:
+                    page_repos, _ = await next_page
+                except Exception as e:
+                    logger.error("Error fetching starred repositories: %s", e)
+                    failed += 1
                     continue
-                starred_repos.extend([Repository.model_validate(repo) for repo in resp])
-            return starred_repos
-
-    @cached(cache=TTLCache(maxsize=500, ttl=1200))
-    def get_latest_release(self, releases_url: str) -> Release:
-        url = releases_url.replace("{/id}", "/latest")
-        resp = self.http.request("GET", url)
-        if resp.status == 404:
-            raise Exception("No releases found for this repository.")
-        elif resp.status != 200:
-            raise Exception("Failed to retrieve latest release. Non-200 status returned.")
-        return Release.model_validate(resp.json())
-
-    @cache(ttl="20m", key="{url}")
+                yield page_repos
+        finally:
+            # The consumer may stop early; don't leave page requests running behind it
+            for task in tasks:
+                task.cancel()
+        if failed:
+            raise Exception(f"Failed to retrieve {failed} of {last_page} pages of starred repos")
+
+    async def _get_release_page(self, url: str) -> tuple[list[Release], LinkHeader]:
+        response = await self._conditional_get(url)
+        if response.status != 200:
+            raise Exception(f"Failed to retrieve releases. Non-200 status {response.status} for: {url}")
+        link_header = parse_link_header(response.headers)  # type: ignore[arg-type]
+
+        validated = self._validated_releases.get(url)
+        if response.not_modified and validated is not None and validated[0] == response.etag:
+            return validated[1], link_header
+        releases = _release_list_adapter.validate_json(response.payload)
+        if response.etag is not None:
+            self._validated_releases[url] = (response.etag, releases)
+        return releases, link_header
+
     async def _fetch_releases_for_repo(
-        self, url: str, session: aiohttp.ClientSession
+        self, url: str, since: datetime | None
     ) -> list[Release] | BaseException:
+        # The window start moves forward between refreshes, so entries are keyed by url and only
+        # served when the window they were fetched for covers the requested one
+        key = f"releases:{url}"
+        cached = await self.cache.get(key)
+        if cached is not None:
+            cached_since, releases = _cached_releases_adapter.validate_json(cached)
+            if _covers(cached_since, releases, since):
+                return (
+                    releases
+                    if since is None
+                    else [release for release in releases if release.created_at > since]
+                )
+        result = await self._fetch_release_pages(url, since)
+        if not isinstance(result, BaseException):
+            await self.cache.set(key, _cached_releases_adapter.dump_json((since, result)), RELEASES_CACHE_TTL)
+        return result
+
+    async def _fetch_release_pages(self, url: str, since: datetime | None) -> list[Release] | BaseException:
         try:
             api_url = url.split("{")[0] if "{" in url else url
-            await to_thread(logger.info, "Fetching latest release from %s", api_url)
-            async with session.get(api_url) as response:
-                self._log_rate_limit(response.headers, sampled=True)
-                response.raise_for_status()
-                data = await response.json()
-                return [Release.model_validate(item) for item in data]
+            await to_thread(logger.info, "Fetching releases from %s", api_url)
+            page_url: str | None = f"{api_url}?per_page={RELEASES_PER_PAGE}"
+            releases: list[Release] = []
+            while page_url is not None:
+                page, link_header = await self._get_release_page(page_url)
+                releases.extend(page)
+                # Only follow the next page if this one still was entirely inside the window
+                page_url = link_header.next if since is not None and _reaches_past(page, since) else None
+            return releases
         except Exception as e:
             return e
 
-    async def get_latest_releases_async(self, urls: list[str]) -> list[list[Release] | BaseException]:
-        async with aiohttp.ClientSession(
-            headers=BASE_HEADERS | {"Authorization": f"Bearer {self.token}"}
-        ) as session:
-            tasks = [self._fetch_releases_for_repo(url, session) for url in urls]
-            results = await gather(*tasks, return_exceptions=True)
-            return results
+    async def get_latest_releases_async(
+        self, urls: list[str], since: datetime | None = None
+    ) -> list[list[Release] | BaseException]:
+        """
+        Retrieve the releases of each repository. With since, pages are followed until a release
+        created at or before since is reached; otherwise only the first page is fetched.
+        """
+        tasks = [self._fetch_releases_for_repo(url, since) for url in urls]
+        results = await gather(*tasks, return_exceptions=True)
+        return results
+
+    async def get_authenticated_user(self) -> AuthenticatedUser:
+        """
+        Return the id and login of the token's user, fetched once per client.
+        """
+        if self._user is None:
+            status, _, payload = await self._request(f"{self.base_url}/user", {})
+            if status == 401:
+                raise InvalidTokenError(f"GitHub rejected {self.name}")
+            if status != 200:
+                raise Exception(
+                    f"Failed to retrieve the authenticated user. Non-200 status returned: {status}"
+                )
+            user = json.loads(payload)
+            self._user = AuthenticatedUser(user["id"], user["login"])
+        return self._user
+
+    async def get_release_event_repos(self, since: datetime) -> set[str] | None:
+        """
+        Return the full names of repositories with a ReleaseEvent after since in the authenticated
+        user's received events, or None if the feed does not reach back to since and some events
+        may have been missed. The feed only covers watched repositories and followed users.
+
+        The first page is requested conditionally, and the feed is not polled again before the
+        X-Poll-Interval it reported has passed; until then the previous events are reused.
+        """
+        if self._release_events is None or time.monotonic() >= self._events_poll_after:
+            self._release_events = await self._poll_received_events()
+        events = self._release_events
+        if len(events) >= EVENTS_PER_PAGE * EVENTS_MAX_PAGES and events[-1].created_at > since:
+            # The feed was exhausted before reaching back to since
+            return None
+        return {
+            event.repo.name for event in events if event.type == "ReleaseEvent" and event.created_at > since
+        }
+
+    async def _poll_received_events(self) -> list[Event]:
+        url: str | None = (
+            f"{self.base_url}/users/{(await self.get_authenticated_user()).login}/received_events?per_page={EVENTS_PER_PAGE}"
+        )
+        events: list[Event] = []
+        poll_interval = DEFAULT_POLL_INTERVAL
+        for page in range(EVENTS_MAX_PAGES):
+            if url is None:
+                break
+            resp = await self._conditional_get(url)
+            if resp.status != 200:
+                raise Exception(
+                    f"Failed to retrieve received events. Non-200 status {resp.status} for: {url}"
+                )
+            if page == 0:
+                poll_interval = int(resp.headers.get("x-poll-interval", DEFAULT_POLL_INTERVAL))
+            events.extend(_event_list_adapter.validate_json(resp.payload))
+            url = parse_link_header(resp.headers).next  # type: ignore[arg-type]
+        self._events_poll_after = time.monotonic() + poll_interval
+        logger.info("Polled %d received events, next poll in %ds", len(events), poll_interval)
+        return events
+
+    async def get_releases_graphql(
+        self, repo_names: list[str], since: datetime | None = None, first: int = GRAPHQL_RELEASES_PER_REPO
+    ) -> list[list[Release] | BaseException]:
+        """
+        Retrieve the latest releases of many repositories (given as "owner/name") with batched
+        GraphQL queries, one aliased repository block per repository. The batch size is chosen
+        so each query stays within GRAPHQL_NODE_BUDGET release nodes.
+
+        With since, repositories whose first releases are all newer than since may have more in
+        the window, so those are completed with the paginated REST fetcher.
+        """
+        first = min(first, GRAPHQL_MAX_PAGE_SIZE)
+        batch_size = max(1, min(GRAPHQL_MAX_BATCH, GRAPHQL_NODE_BUDGET // first))
+        batches = [repo_names[start : start + batch_size] for start in range(0, len(repo_names), batch_size)]
+        logger.info("Fetching releases for %d repos in %d GraphQL queries", len(repo_names), len(batches))
+        batch_results = await gather(*[self._query_releases_batch(batch, first) for batch in batches])
+        results = [result for batch in batch_results for result in batch]
+
+        if since is not None:
+            truncated = [
+                i
+                for i, result in enumerate(results)
+                if isinstance(result, list) and len(result) == first and _reaches_past(result, since)
+            ]
+            rest_results = await gather(
+                *[
+                    self._fetch_releases_for_repo(f"{self.base_url}/repos/{repo_names[i]}/releases", since)
+                    for i in truncated
+                ]
+            )
+            for i, rest_result in zip(truncated, rest_results, strict=True):
+                results[i] = rest_result
+        return results
+
+    async def _query_releases_batch(
+        self, repo_names: list[str], first: int
+    ) -> list[list[Release] | BaseException]:
+        variables: dict[str, Any] = {"first": first}
+        declarations = ["$first: Int!"]
+        blocks = []
+        for i, repo_name in enumerate(repo_names):
+            owner, _, name = repo_name.partition("/")
+            variables[f"o{i}"], variables[f"n{i}"] = owner, name
+            declarations.append(f"$o{i}: String!, $n{i}: String!")
+            blocks.append(f"r{i}: repository(owner: $o{i}, name: $n{i}) {{ ...releases }}")
+        query = (
+            f"query({', '.join(declarations)}) {{ rateLimit {{ cost remaining }} {' '.join(blocks)} }}"
+            + GRAPHQL_RELEASES_FRAGMENT
+        )
+        try:
+            status, _, payload = await self._request(
+                f"{self.base_url}/graphql", {}, method="POST", body={"query": query, "variables": variables}
+            )
+            if status != 200:
+                raise Exception(f"GraphQL release query failed with status {status}")
+            data = json.loads(payload).get("data") or {}
+        except Exception as e:
+            return [e] * len(repo_names)
+
+        if rate_limit := data.get("rateLimit"):
+            logger.info("GraphQL query cost: %s, Remaining: %s", rate_limit["cost"], rate_limit["remaining"])
+        results: list[list[Release] | BaseException] = []
+        for i, repo_name in enumerate(repo_names):
+            repository = data.get(f"r{i}")
+            if repository is None:
+                results.append(Exception(f"No repository returned by GraphQL for {repo_name}"))
+                continue
+            try:
+                results.append(
+                    [
+                        _release_from_graphql(self.base_url, repo_name, node)
+                        for node in repository["releases"]["nodes"]
+                    ]
+                )
+            except Exception as e:
+                results.append(e)
+        return results
 
     def _log_rate_limit(self, resp_headers: "CIMultiDictProxy[str]", sampled: bool) -> None:
         if "x-ratelimit-limit" in resp_headers:
@@ -157,3 +670,133 @@ class GitHubClient:
                     used,
                     reset,
                 )
+
+
+class GitHubClientPool:
+    """
+    GitHub clients for the tokens of the users served by the instance, least recently used first.
+    Past max_clients, the least recently used client is evicted. Every client has its own rate limit
+    scheduler, as GitHub budgets requests per token, but they share the response cache, which also holds the validators for conditional requests.
+    """
+
+    def __init__(
+        self,
+        cache: CacheBackend | None = None,
+        max_clients: int = MAX_POOLED_CLIENTS,
+        base_url: str = BASE_URL,
+    ) -> None:
+        self.cache = cache if cache is not None else MemoryCacheBackend()
+        self.max_clients = max_clients
+        self.base_url = base_url
+        self._clients: OrderedDict[str, GitHubClient] = OrderedDict()
+        # Evicted clients with the time they were evicted, kept open for requests still using them
+        self._evicted: dict[str, tuple[float, GitHubClient]] = {}
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def get(self, token: str) -> GitHubClient:
+        key = _token_key(token)
+        client = self._clients.get(key)
+        if client is not None:
+            self._clients.move_to_end(key)
+            return client
+        # A returning token gets its evicted client back, so it never has two schedulers
+        _, client = self._evicted.pop(key, (0.0, None))
+        if client is None:
+            client = GitHubClient(token, self.base_url, cache=self.cache)
+        self._clients[key] = client
+        while len(self._clients) > self.max_clients:
+            evicted_key, evicted = self._clients.popitem(last=False)
+            self._evicted[evicted_key] = (time.monotonic(), evicted)
+        return client
+
+    async def discard(self, token: str) -> None:
+        key = _token_key(token)
+        client = self._clients.pop(key, None)
+        _, evicted = self._evicted.pop(key, (0.0, None))
+        await gather(*(c.close() for c in (client, evicted) if c is not None))
+
+    def clients(self) -> list[GitHubClient]:
+        return list(self._clients.values())
+
+    async def close_evicted(self) -> None:
+        """
+        Close the sessions of clients evicted more than EVICTED_CLIENT_GRACE seconds ago.
+        """
+        cutoff = time.monotonic() - EVICTED_CLIENT_GRACE
+        expired = [key for key, (evicted_at, _) in self._evicted.items() if evicted_at <= cutoff]
+        await gather(*(self._evicted.pop(key)[1].close() for key in expired))
+        if expired:
+            logger.debug("Closed the sessions of %d evicted GitHub clients", len(expired))
+
+    async def close(self) -> None:
+        await gather(
+            *(client.close() for client in [*self._clients.values(), *(c for _, c in self._evicted.values())])
+        )
+        self._clients.clear()
+        self._evicted.clear()
+
+
+def _retry_after_seconds(value: str) -> float | None:
+    """
+    Parse a Retry-After header, given either in seconds or as an HTTP date.
+    """
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(UTC)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def _page_number(url: str) -> int:
+    return int(parse_qs(urlsplit(url).query).get("page", ["1"])[0])
+
+
+def _reaches_past(releases: list[Release], since: datetime) -> bool:
+    """
+    Whether every release on the page is newer than since, so the next page may hold more of them.
+    """
+    return bool(releases) and min(release.created_at for release in releases) > since
+
+
+def _covers(cached_since: datetime | None, releases: list[Release], since: datetime | None) -> bool:
+    """
+    Whether releases fetched for the window starting at cached_since hold every release after since.
+    Without a window only the first page was fetched, which covers one only if it reaches past since.
+    """
+    if cached_since is None:
+        return since is None or not _reaches_past(releases, since)
+    return since is not None and cached_since <= since
+
+
+def _release_from_graphql(base_url: str, repo_name: str, node: dict[str, Any]) -> Release:
+    """
+    Map a GraphQL release node onto the REST release model, rebuilding the REST URLs.
+    """
+    api_url = f"{base_url}/repos/{repo_name}"
+    return Release.model_validate(
+        {
+            "id": node["databaseId"],
+            "node_id": node["id"],
+            "html_url": node["url"],
+            "assets_url": f"{api_url}/releases/{node['databaseId']}/assets",
+            "tarball_url": f"{api_url}/tarball/{node['tagName']}",
+            "zipball_url": f"{api_url}/zipball/{node['tagName']}",
+            "tag_name": node["tagName"],
+            "target_commitish": (node.get("tagCommit") or {}).get("oid", ""),
+            "name": node["name"],
+            "body": node["description"] or "",
+            "draft": node["isDraft"],
+            "prelease": node["isPrerelease"],
+            "created_at": node["createdAt"],
+            "published_at": node["publishedAt"] or node["createdAt"],
+        }
+    )
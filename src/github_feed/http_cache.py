@@ -0,0 +1,132 @@
+import logging
+import sqlite3
+import threading
+import time
+from asyncio import to_thread
+from typing import Protocol
+
+from cachetools import LRUCache
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Eviction scans the whole table, so it only runs every so many writes
+EVICTION_INTERVAL = 64
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(Protocol):
+    """
+    Store for serialized GitHub API results, each entry expiring after its own TTL.
+    """
+
+    async def get(self, key: str) -> bytes | None: ...
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class MemoryCacheBackend:
+    """
+    Cache private to the current process, evicting the least recently used entries past max_entries.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self._entries: LRUCache[str, tuple[float, bytes]] = LRUCache(maxsize=max_entries)
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            self._entries.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries[key] = (time.time() + ttl, value)
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+
+class SqliteCacheBackend:
+    """
+    Cache kept in a SQLite file, so it survives restarts and can be shared by several worker processes.
+    Reads refresh an entry's access time, and once the stored values exceed max_bytes the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        # Autocommit mode: every statement is its own short transaction, so other processes are
+        # never blocked for longer than a single read or write
+        self._conn = sqlite3.connect(filename, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_http_cache_accessed_at ON http_cache (accessed_at)")
+
+    async def get(self, key: str) -> bytes | None:
+        return await to_thread(self._get, key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await to_thread(self._set, key, value, ttl)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _get(self, key: str) -> bytes | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM http_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM http_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE http_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]  # type: ignore[no-any-return]
+
+    def _set(self, key: str, value: bytes, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            self._writes_since_eviction += 1
+            if self._writes_since_eviction >= EVICTION_INTERVAL:
+                self._evict(now)
+
+    def evict(self) -> None:
+        """
+        Drop expired entries, then the least recently used ones until the cache fits in max_bytes.
+        """
+        with self._lock:
+            self._evict(time.time())
+
+    def _evict(self, now: float) -> None:
+        self._writes_since_eviction = 0
+        expired = self._conn.execute("DELETE FROM http_cache WHERE expires_at <= ?", (now,)).rowcount
+        evicted = self._conn.execute(
+            "DELETE FROM http_cache WHERE key IN ("
+            "SELECT key FROM ("
+            "SELECT key, SUM(length(value)) OVER (ORDER BY accessed_at DESC, key) AS running_size "
+            "FROM http_cache"
+            ") WHERE running_size > ?)",
+            (self.max_bytes,),
+        ).rowcount
+        if expired or evicted:
+            logger.info("Dropped %d expired and %d least recently used cache entries", expired, evicted)
@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
 from functools import cached_property
@@ -6,6 +7,8 @@ from zoneinfo import ZoneInfo
 
 from pydantic import BaseModel, EmailStr, Field, computed_field
 
+LOCAL_TZ = ZoneInfo("America/Phoenix")
+
 
 class LinkHeader(BaseModel):
     next: str | None = None
@@ -331,6 +334,107 @@ class Repository(BaseModel):
     )
 
 
+@dataclass(slots=True, kw_only=True)
+class RepositoryRecord:
+    """
+    Flat record of the repository fields the feed stores and serves, validated straight from API
+    responses. Unknown fields, including the nested owner, license and permissions objects, are
+    skipped. Use Repository when the full GitHub schema is needed, e.g. for exports.
+    """
+
+    id: int
+    node_id: str
+    name: str
+    full_name: str
+    forks: int
+    private: bool
+    html_url: str
+    description: str | None = None
+    fork: bool
+    url: str | None = None
+    assignees_url: str
+    blobs_url: str
+    branches_url: str
+    collaborators_url: str
+    comments_url: str
+    commits_url: str
+    compare_url: str
+    contents_url: str
+    contributors_url: str | None = None
+    deployments_url: str | None = None
+    downloads_url: str | None = None
+    events_url: str | None = None
+    forks_url: str | None = None
+    git_commits_url: str
+    git_refs_url: str
+    git_tags_url: str
+    git_url: str
+    issue_comment_url: str
+    issue_events_url: str
+    issues_url: str
+    keys_url: str
+    labels_url: str
+    languages_url: str | None = None
+    merges_url: str | None = None
+    milestones_url: str
+    notifications_url: str
+    pulls_url: str
+    releases_url: str
+    ssh_url: str
+    stargazers_url: str | None = None
+    statuses_url: str
+    subscribers_url: str | None = None
+    tags_url: str | None = None
+    trees_url: str
+    homepage: str | None = None
+    language: str | None
+    forks_count: int
+    stargazers_count: int
+    watchers_count: int
+    size: int
+    default_branch: str
+    open_issues_count: int
+    has_issues: bool
+    has_pages: bool
+    has_downloads: bool
+    archived: bool
+    disabled: bool
+    visibility: str | None = "public"
+    pushed_at: datetime | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    open_issues: int
+    watchers: int
+    master_branch: str | None = None
+    starred_at: str | None = None
+
+
+@dataclass(slots=True)
+class StarredRecord:
+    """
+    Item returned by the starred endpoints when using the star+json media type.
+    """
+
+    starred_at: str
+    repo: RepositoryRecord
+
+
+class EventRepo(BaseModel):
+    id: int
+    name: str
+
+
+class Event(BaseModel):
+    """
+    Item of the GitHub events API; only the fields needed to spot new releases are kept.
+    """
+
+    id: str
+    type: str | None
+    repo: EventRepo
+    created_at: datetime
+
+
 class Release(BaseModel):
     id: int
     html_url: str
@@ -353,7 +457,7 @@ class Release(BaseModel):
         """
         Convert the created_at field to a local timezone-aware datetime object.
         """
-        return self.created_at.astimezone(ZoneInfo("America/Phoenix"))
+        return self.created_at.astimezone(LOCAL_TZ)
 
     @computed_field  # type: ignore[prop-decorator]
     @cached_property
@@ -361,4 +465,4 @@ class Release(BaseModel):
         """
         Convert the published_at field to a local timezone-aware datetime object.
         """
-        return self.published_at.astimezone(ZoneInfo("America/Phoenix"))
+        return self.published_at.astimezone(LOCAL_TZ)
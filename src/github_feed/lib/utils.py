@@ -1,21 +1,9 @@
-import pathlib
+import base64
+import binascii
 
 import urllib3
 
-from github_feed.lib.models import LinkHeader, Repository
-from github_feed.sql.models import Repository as SqlRepository
-
-
-def save_starred_repos(repos: list[Repository], filename: str) -> None:
-    with pathlib.Path(filename).open("w") as file:
-        file.write("[\n")
-        for i, repo in enumerate(repos):
-            file.write(f"{repo.model_dump_json(indent=2)}")
-            if i < len(repos) - 1:
-                file.write(",\n")
-            else:
-                file.write("\n")
-        file.write("]\n")
+from github_feed.lib.models import LinkHeader
 
 
 def _clean_link(link: str) -> str:
@@ -58,16 +46,19 @@ def extract_repo_name_from_html_url(html_url: str) -> str:
     return url_parts[-4]
 
 
-def update_existing_repo(existing: SqlRepository, fresh: Repository) -> SqlRepository:
-    existing.description = fresh.description
-    existing.stargazers_count = fresh.stargazers_count
-    existing.forks_count = fresh.forks_count
-    existing.watchers_count = fresh.watchers_count
-    existing.watchers = fresh.watchers
-    existing.pushed_at = fresh.pushed_at
-    existing.updated_at = fresh.updated_at
-    existing.homepage = fresh.homepage
-    existing.size = fresh.size
-    existing.open_issues = fresh.open_issues
-    existing.open_issues_count = fresh.open_issues_count
-    return existing
+def encode_cursor(key: str, item_id: int) -> str:
+    """
+    Encode the sort key and id of the last item on a page as an opaque pagination cursor.
+    """
+    return base64.urlsafe_b64encode(f"{key}|{item_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    """
+    Decode a cursor created by encode_cursor. Raises ValueError if the cursor is malformed.
+    """
+    try:
+        key, _, item_id = base64.urlsafe_b64decode(cursor.encode()).decode().rpartition("|")
+        return key, int(item_id)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
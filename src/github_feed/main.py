@@ -1,17 +1,26 @@
+import asyncio
 import logging
-from contextlib import asynccontextmanager
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+from datetime import UTC, datetime, timedelta
 from logging.handlers import RotatingFileHandler
-from typing import Annotated
+from typing import Annotated, Literal
 
-from fastapi import Depends, FastAPI
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from rich.logging import RichHandler
 
-from github_feed.engine import Engine, get_db_client
+from github_feed.analytics import LanguageWeek, OwnerActivity, ReleaseCadence
+from github_feed.engine import Engine
+from github_feed.github_client import InvalidTokenError
 from github_feed.lib.models import Release
+from github_feed.lib.utils import decode_cursor, encode_cursor
+from github_feed.response_cache import CachedResponse
 from github_feed.sql.models import Release as SqlRelease
-from github_feed.sql.models import Repository
+from github_feed.sql.models import ReleaseSummary, Repository, RepositorySummary, SearchResult
 
 logging.basicConfig(
     handlers=[
@@ -23,17 +32,85 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_SEARCH_PAGE_SIZE = 20
+# Seconds between comment lines on an idle stream, which keep proxies from closing it
+STREAM_KEEPALIVE_INTERVAL = 15
+# Releases read from the db at a time when a stream resumes from Last-Event-ID
+STREAM_BACKLOG_LIMIT = 1000
+DEFAULT_ANALYTICS_DAYS = 365
+MAX_PAGE_SIZE = 1000
+# Responses smaller than this are not worth compressing
+GZIP_MINIMUM_SIZE = 1000
+
+_repository_list_adapter = TypeAdapter(list[Repository])
+_repository_summary_list_adapter = TypeAdapter(list[RepositorySummary])
+_sql_release_list_adapter = TypeAdapter(list[SqlRelease])
+_release_summary_list_adapter = TypeAdapter(list[ReleaseSummary])
+_sql_release_adapter = TypeAdapter(SqlRelease)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):  # type: ignore[no-untyped-def]
-    db_client = get_db_client()  # trigger db creation
+    # A single engine serves every request for the lifetime of the process
+    engine = Engine()  # trigger db creation
+    await engine.gh_client.open()
+    app.state.engine = engine
+    refresher = None
+    if engine.config.refresh_interval > 0:
+        refresher = asyncio.create_task(engine.refresh_periodically())
     yield
-    del db_client
+    if refresher is not None:
+        refresher.cancel()
+        with suppress(asyncio.CancelledError):
+            await refresher
+    await engine.close()
+
+
+def get_engine(request: Request) -> Engine:
+    return request.app.state.engine  # type: ignore[no-any-return]
+
+
+def get_token(authorization: Annotated[str | None, Header()] = None) -> str | None:
+    """
+    The GitHub token a request is authenticated with, as `Authorization: Bearer <token>`.
+    """
+    if authorization is None:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() not in ("bearer", "token") or not token.strip():
+        raise HTTPException(
+            status_code=401, detail="Expected a bearer token", headers={"WWW-Authenticate": "Bearer"}
+        )
+    return token.strip()
+
+
+async def get_user_id(
+    engine: Annotated[Engine, Depends(get_engine)], token: Annotated[str | None, Depends(get_token)]
+) -> int:
+    """
+    Requests authenticated with a GitHub token get the view of that token's user, others the
+    view of the instance owner. Pooled users' stars are never visible without their token.
+    """
+    if token is None:
+        try:
+            return (await engine.gh_client.get_authenticated_user()).id
+        except Exception as e:
+            raise HTTPException(status_code=503, detail="Could not look up the instance owner") from e
+    try:
+        return await engine.user_id_for(token)
+    except InvalidTokenError as e:
+        raise HTTPException(
+            status_code=401, detail="Invalid GitHub token", headers={"WWW-Authenticate": "Bearer"}
+        ) from e
+    except Exception as e:
+        # GitHub being down or rate limiting says nothing about the token, so its client is kept
+        raise HTTPException(status_code=503, detail="Could not look up the token's user") from e
 
 
 app = FastAPI(title="github-feed", lifespan=lifespan)
 
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -48,27 +125,323 @@ async def read_root() -> dict[str, str]:
     return {"message": "Welcome to the GitHub Feed API!"}
 
 
-@app.get("/starred")
+async def staleness_headers(engine: Engine) -> dict[str, str]:
+    """
+    Report when the data was last refreshed from GitHub.
+    """
+    last_refreshed_at = await engine.last_refreshed_at()
+    if last_refreshed_at is None:
+        return {}
+    return {"X-Last-Refreshed": last_refreshed_at.isoformat()}
+
+
+def next_link_header(request: Request, next_cursor: str) -> dict[str, str]:
+    """
+    Point to the next page with a Link header, as the GitHub API does.
+    """
+    next_url = request.url.include_query_params(cursor=next_cursor)
+    return {"Link": f'<{next_url}>; rel="next"'}
+
+
+def response_cache_key(request: Request, user_id: int) -> str:
+    return f"{user_id}:{request.url.path}?{sorted(request.query_params.multi_items())}"
+
+
+def cached_json_response(request: Request, entry: CachedResponse) -> Response:
+    """
+    Answer from a cached response: 304 if the client already has it, otherwise the stored
+    bytes, gzipped up front when the client accepts it.
+    """
+    # Staleness is reported by X-Last-Refreshed alone; Age would tell HTTP caches the response is stale
+    headers = entry.headers | {"ETag": entry.etag, "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if entry.etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", "") and len(entry.body) >= GZIP_MINIMUM_SIZE:
+        headers["Content-Encoding"] = "gzip"
+        return Response(entry.gzipped_body, media_type="application/json", headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
+def parse_cursor(cursor: str | None) -> tuple[str, int] | None:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+
+def as_utc(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=UTC)
+    return timestamp.astimezone(UTC)
+
+
+def as_starred_at(timestamp: datetime | None) -> str | None:
+    """
+    Format a timestamp the way GitHub reports starred_at, so they can be compared as strings.
+    """
+    return as_utc(timestamp).strftime("%Y-%m-%dT%H:%M:%SZ") if timestamp is not None else None
+
+
+@app.get("/starred", response_model=list[RepositorySummary] | list[Repository])
 async def get_starred_repos(
-    engine: Annotated[Engine, Depends(Engine)], refresh: bool = True
-) -> list[Repository]:
+    engine: Annotated[Engine, Depends(get_engine)],
+    token: Annotated[str | None, Depends(get_token)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    request: Request,
+    refresh: bool = False,
+    full: bool = False,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    expand: Literal["full"] | None = None,
+) -> Response:
     """
     Retrieve starred repositories from the database with the option to refresh the data.
+    The database is kept current by the background refresher, so a refresh is rarely needed.
+    A refresh only fetches newly starred repositories unless a full refresh is requested.
+
+    Repositories are returned most recently starred first, a page at a time, with a Link header
+    pointing to the next page. Pass since to only get repositories starred after that time.
+    Only the list view columns are returned unless expand=full is given.
+    Only the repositories starred by the token's user, or the instance owner without a token, are returned.
     """
-    repos = list(await engine.retrieve_starred_repos(refresh=refresh))
-    return repos
+    if refresh:
+        logger.info("Refreshing starred repositories")
+        await engine.refresh_starred_repos(full=full, client=engine.client_for(token))
+    cache_key = response_cache_key(request, user_id)
+    entry = engine.response_cache.get(cache_key)
+    if entry is None:
+        starred_since, starred_until, starred_cursor = (
+            as_starred_at(since),
+            as_starred_at(until),
+            parse_cursor(cursor),
+        )
+        headers = await staleness_headers(engine)
+        last: RepositorySummary | Repository | None = None
+        if expand == "full":
+            repos = list(
+                await engine.retrieve_starred_repos(
+                    since=starred_since,
+                    until=starred_until,
+                    limit=limit,
+                    cursor=starred_cursor,
+                    user_id=user_id,
+                )
+            )
+            body = _repository_list_adapter.dump_json(repos)
+            last = repos[-1] if len(repos) == limit else None
+        else:
+            summaries = await engine.retrieve_starred_repo_summaries(
+                since=starred_since, until=starred_until, limit=limit, cursor=starred_cursor, user_id=user_id
+            )
+            body = _repository_summary_list_adapter.dump_json(summaries)
+            last = summaries[-1] if len(summaries) == limit else None
+        if last is not None:
+            headers |= next_link_header(request, encode_cursor(last.starred_at or "", last.id or 0))
+        entry = engine.response_cache.put(cache_key, body, headers)
+    return cached_json_response(request, entry)
 
 
-@app.get("/releases")
+@app.get("/releases", response_model=list[ReleaseSummary] | list[SqlRelease] | list[Release])
 async def get_releases(
-    engine: Annotated[Engine, Depends(Engine)], refresh: bool = False
-) -> list[Release] | list[SqlRelease]:
+    engine: Annotated[Engine, Depends(get_engine)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    request: Request,
+    refresh: bool = False,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    expand: Literal["body", "full"] | None = None,
+) -> Response | list[Release]:
     """
     Retrieve releases from the database with the option to refresh the data.
+
+    Stored releases created in the since/until window (the last 3 days by default) are returned
+    newest first, a page at a time, with a Link header pointing to the next page. Pollers can pass
+    the created_at of the newest release they have seen as since to only get new releases.
+    Only the list view columns are returned unless expand=body (or expand=full) is given.
+    Only the releases of the repositories starred by the token's user, or the instance owner without a
+    token, are returned.
+
+    Responses carry an ETag and are served from a cache of serialized bodies until a refresh
+    stores new releases.
     """
     if refresh:
         logger.info("Refreshing releases")
-        return await engine.retrieve_fresh_releases_async()
-    else:
+        return await engine.retrieve_fresh_releases_async(user_id=user_id)
+
+    cache_key = response_cache_key(request, user_id)
+    entry = engine.response_cache.get(cache_key)
+    if entry is None:
         logger.info("Retrieving releases from the db")
-        return engine.retrieve_releases(start_time=None)
+        release_cursor = parse_cursor(cursor)
+        try:
+            keyset = (
+                (datetime.fromisoformat(release_cursor[0]), release_cursor[1]) if release_cursor else None
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail="Invalid cursor") from e
+        start_time = as_utc(since) if since is not None else None
+        end_time = as_utc(until) if until is not None else None
+        headers = await staleness_headers(engine)
+        releases: list[ReleaseSummary] | list[SqlRelease]
+        if expand is not None:
+            releases = await engine.retrieve_releases_async(start_time, end_time, limit, keyset, user_id)
+            body = _sql_release_list_adapter.dump_json(releases)
+        else:
+            releases = await engine.retrieve_release_summaries_async(
+                start_time, end_time, limit, keyset, user_id
+            )
+            body = _release_summary_list_adapter.dump_json(releases)
+        if len(releases) == limit:
+            last = releases[-1]
+            headers |= next_link_header(request, encode_cursor(last.created_at.isoformat(), last.id or 0))
+        entry = engine.response_cache.put(cache_key, body, headers)
+    return cached_json_response(request, entry)
+
+
+def release_event(release: SqlRelease) -> tuple[str, tuple[datetime, int]]:
+    """
+    Format a release as a server-sent event, identified by the cursor to resume after it.
+    """
+    stored_at = as_utc(release.stored_at or datetime.now(UTC))
+    cursor = (stored_at, release.id or 0)
+    event_id = encode_cursor(stored_at.isoformat(), cursor[1])
+    data = _sql_release_adapter.dump_json(release).decode()
+    return f"id: {event_id}\nevent: release\ndata: {data}\n\n", cursor
+
+
+async def release_events(
+    engine: Engine, request: Request, cursor: tuple[datetime, int] | None, user_id: int
+) -> AsyncIterator[str]:
+    # Subscribe before replaying the backlog, so releases stored in between aren't missed
+    with engine.release_broker.subscribe() as subscription:
+        while cursor is not None:
+            backlog = await engine.db.get_releases_stored_after_async(cursor, STREAM_BACKLOG_LIMIT, user_id)
+            for release in backlog:
+                event, cursor = release_event(release)
+                yield event
+            if len(backlog) < STREAM_BACKLOG_LIMIT:
+                break
+        while not await request.is_disconnected():
+            try:
+                releases = await asyncio.wait_for(subscription.get(), STREAM_KEEPALIVE_INTERVAL)
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if releases is None:
+                # Fell behind; the client reconnects with Last-Event-ID and catches up from the db
+                return
+            starred = await engine.db.get_starred_repo_ids_async(user_id)
+            for release in releases:
+                if release.stored_at is None or release.id is None or release.repository_id not in starred:
+                    continue
+                if cursor is None or (as_utc(release.stored_at), release.id) > cursor:
+                    event, cursor = release_event(release)
+                    yield event
+
+
+@app.get("/releases/stream")
+async def stream_releases(
+    engine: Annotated[Engine, Depends(get_engine)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    request: Request,
+    last_event_id: Annotated[str | None, Header()] = None,
+) -> StreamingResponse:
+    """
+    Stream releases as server-sent events as soon as a refresh stores them.
+    A client reconnecting with the Last-Event-ID header first gets the releases stored since that event.
+    Only the releases of the repositories starred by the token's user, or the instance owner without a
+    token, are streamed.
+    """
+    cursor = None
+    if last_event_id is not None:
+        key, release_id = parse_cursor(last_event_id) or ("", 0)
+        try:
+            cursor = (as_utc(datetime.fromisoformat(key)), release_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID") from e
+    return StreamingResponse(
+        release_events(engine, request, cursor, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/search")
+async def search(
+    engine: Annotated[Engine, Depends(get_engine)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    request: Request,
+    response: Response,
+    q: Annotated[str, Query(min_length=1)],
+    kind: Literal["repository", "release"] | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_SEARCH_PAGE_SIZE,
+    offset: Annotated[int, Query(ge=0)] = 0,
+) -> list[SearchResult]:
+    """
+    Full-text search over starred repositories (name, description, language) and releases
+    (name, tag, notes), ranked within each kind with repositories and releases interleaved.
+    Snippets are HTML-escaped, with the matched terms wrapped in <mark> tags. Every word of q has
+    to match; pass kind to only search repositories or releases. A Link header points to the next
+    page of results.
+    Only the repositories starred by the token's user, or the instance owner without a token, and their
+    releases are searched.
+    """
+    kinds: tuple[Literal["repository", "release"], ...] = (
+        (kind,) if kind is not None else ("repository", "release")
+    )
+    results = await engine.search(q, kinds, limit, offset, user_id)
+    if len(results) == limit:
+        next_url = request.url.include_query_params(offset=offset + limit)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return results
+
+
+def analytics_since(since: datetime | None) -> datetime:
+    return as_utc(since) if since is not None else datetime.now(UTC) - timedelta(days=DEFAULT_ANALYTICS_DAYS)
+
+
+@app.get("/analytics/languages")
+async def get_releases_per_language(
+    engine: Annotated[Engine, Depends(get_engine)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    since: datetime | None = None,
+) -> list[LanguageWeek]:
+    """
+    Count releases per week and repository language, over the last year unless since is given.
+    """
+    return await engine.analytics.releases_per_language_async(analytics_since(since), user_id)
+
+
+@app.get("/analytics/owners")
+async def get_most_active_owners(
+    engine: Annotated[Engine, Depends(get_engine)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    since: datetime | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+) -> list[OwnerActivity]:
+    """
+    Rank the users and orgs owning starred repos by the releases they published since the given time.
+    """
+    return await engine.analytics.most_active_owners_async(analytics_since(since), limit, user_id)
+
+
+@app.get("/analytics/cadence")
+async def get_release_cadence(
+    engine: Annotated[Engine, Depends(get_engine)],
+    user_id: Annotated[int, Depends(get_user_id)],
+    since: datetime | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+) -> list[ReleaseCadence]:
+    """
+    Report the typical number of days between releases of each starred repo, most frequent first.
+    """
+    return await engine.analytics.release_cadence_async(analytics_since(since), limit, user_id)
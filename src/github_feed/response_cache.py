@@ -0,0 +1,46 @@
+import gzip
+import hashlib
+import logging
+from typing import NamedTuple
+
+from cachetools import TTLCache
+
+# Serialized responses are also bounded in time, since the default /releases window moves with the clock
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL = 60
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    gzipped_body: bytes
+    etag: str
+    headers: dict[str, str]
+
+
+class ResponseCache:
+    """
+    Pre-serialized (and pre-gzipped) JSON bodies of read endpoints, keyed by path and query string.
+    Entries are dropped whenever a refresh writes new data.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: int = DEFAULT_TTL) -> None:
+        self._entries: TTLCache[str, CachedResponse] = TTLCache(maxsize=max_entries, ttl=ttl)
+
+    def get(self, key: str) -> CachedResponse | None:
+        return self._entries.get(key)
+
+    def put(self, key: str, body: bytes, headers: dict[str, str] | None = None) -> CachedResponse:
+        entry = CachedResponse(
+            body=body,
+            gzipped_body=gzip.compress(body),
+            etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+            headers=headers or {},
+        )
+        self._entries[key] = entry
+        return entry
+
+    def invalidate(self) -> None:
+        if self._entries:
+            logger.info("Invalidating %d cached responses", len(self._entries))
+        self._entries.clear()
@@ -1,15 +1,252 @@
-from collections.abc import Sequence
-from datetime import datetime
+import html
+import logging
+from asyncio import get_running_loop
+from collections.abc import Callable, Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
+from functools import partial
+from typing import Any, Literal
 
-from sqlmodel import Session, SQLModel, create_engine, select
+import pyarrow as pa
+from pydantic import BaseModel
+from sqlalchemy import Connection, delete, event, inspect, text, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.pool import ConnectionPoolEntry, QueuePool, StaticPool
+from sqlalchemy.types import TypeDecorator, TypeEngine
+from sqlmodel import Session, SQLModel, col, create_engine, func, select
 
-from github_feed.sql.models import Release, Repository, RunData, User
+from github_feed.sql.models import (
+    Release,
+    ReleaseSummary,
+    Repository,
+    RepositorySummary,
+    RunData,
+    SearchResult,
+    Star,
+    User,
+)
+
+logger = logging.getLogger(__name__)
+READ_THREADS = 4
+# Connections for the read and write threads, plus overflow for synchronous callers
+POOL_SIZE = READ_THREADS + 1
+POOL_MAX_OVERFLOW = 4
+# Values per IN (...) clause, well under SQLite's bound-parameter limit
+IN_CLAUSE_SIZE = 500
+# Arrow column types for the Python types of the table columns; datetimes are read back in UTC
+ARROW_TYPES: dict[type, pa.DataType] = {
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+    bool: pa.bool_(),
+    bytes: pa.binary(),
+    datetime: pa.timestamp("us", tz="UTC"),
+}
+
+# Full-text indexes kept in sync with their tables by triggers: table -> (index, indexed columns)
+SEARCH_INDEXES = {
+    "repository": ("repository_fts", ["full_name", "description", "language"]),
+    "release": ("release_fts", ["name", "tag_name", "body"]),
+}
+
+# Snippets are built from third-party text, so matches are marked with private-use characters that are
+# swapped for <mark> tags once the rest of the snippet is HTML-escaped
+SNIPPET_MARK_START = "\ue000"
+SNIPPET_MARK_END = "\ue001"
+
+# A null :user_id searches the repos starred by any user
+SEARCH_QUERIES = {
+    # Matches in the name weigh more than in the description or release notes
+    "repository": """
+        SELECT 'repository' AS kind, repository.id, repository.full_name AS title, repository.html_url,
+               snippet(repository_fts, -1, :mark_start, :mark_end, '…', 16) AS snippet,
+               bm25(repository_fts, 10.0, 2.0, 1.0) AS rank
+        FROM repository_fts JOIN repository ON repository.id = repository_fts.rowid
+        WHERE repository_fts MATCH :query
+          AND (:user_id IS NULL OR repository.id IN (SELECT repository_id FROM star WHERE user_id = :user_id))
+    """,
+    "release": """
+        SELECT 'release' AS kind, "release".id, coalesce("release".name, "release".tag_name) AS title,
+               "release".html_url,
+               snippet(release_fts, -1, :mark_start, :mark_end, '…', 16) AS snippet,
+               bm25(release_fts, 5.0, 5.0, 1.0) AS rank
+        FROM release_fts JOIN "release" ON "release".id = release_fts.rowid
+        WHERE release_fts MATCH :query
+          AND (:user_id IS NULL OR "release".repository_id IN (
+              SELECT repository_id FROM star WHERE user_id = :user_id
+          ))
+    """,
+}
+
+
+def _match_expression(query: str) -> str:
+    """
+    Quote every word of a search so FTS5 matches them literally, all of them required.
+    """
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in query.split())
+
+
+def _highlight(snippet: str) -> str:
+    """
+    HTML-escape a snippet, then wrap its marked matches in <mark> tags.
+    """
+    return html.escape(snippet).replace(SNIPPET_MARK_START, "<mark>").replace(SNIPPET_MARK_END, "</mark>")
+
+
+def _arrow_type(column_type: TypeEngine[Any]) -> pa.DataType:
+    if isinstance(column_type, TypeDecorator):
+        # e.g. sqlmodel's AutoString, which reports no python_type of its own
+        column_type = column_type.impl_instance
+    return ARROW_TYPES[column_type.python_type]
+
+
+class SqliteProfile(BaseModel):
+    """
+    PRAGMA settings applied to every new SQLite connection.
+    """
+
+    # WAL lets readers proceed while a refresh is writing
+    journal_mode: str = "WAL"
+    # NORMAL is durable with WAL except for the last transactions on power loss
+    synchronous: str = "NORMAL"
+    mmap_size: int = 256 * 1024 * 1024
+    # Negative values are in KiB
+    cache_size: int = -64 * 1024
+    temp_store: str = "MEMORY"
+    busy_timeout: int = 5000
+
+    def apply(self, dbapi_connection: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in self.model_dump().items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        finally:
+            cursor.close()
 
 
 class DbClient:
-    def __init__(self, db_url: str) -> None:
-        self.engine = create_engine(db_url, echo=False)
+    """
+    Synchronous access to the feed database, plus *_async variants for use on the event loop.
+
+    The async variants run the blocking SQLite calls on worker threads: writes go through a single
+    thread so they are serialized, while reads have a small pool of their own and are not queued
+    behind a refresh that is committing.
+    """
+
+    def __init__(self, db_url: str, profile: SqliteProfile | None = None) -> None:
+        if db_url in ("sqlite://", "sqlite:///:memory:"):
+            # An in-memory database only exists on its connection, so share one across threads
+            self.engine = create_engine(
+                db_url, echo=False, connect_args={"check_same_thread": False}, poolclass=StaticPool
+            )
+        else:
+            self.engine = create_engine(
+                db_url,
+                echo=False,
+                connect_args={"check_same_thread": False},
+                poolclass=QueuePool,
+                pool_size=POOL_SIZE,
+                max_overflow=POOL_MAX_OVERFLOW,
+            )
+        self.profile = profile if profile is not None else SqliteProfile()
+
+        @event.listens_for(self.engine, "connect")
+        def _apply_profile(dbapi_connection: Any, connection_record: ConnectionPoolEntry) -> None:
+            self.profile.apply(dbapi_connection)
+
         SQLModel.metadata.create_all(self.engine)
+        self._migrate()
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+        self._read_executor = ThreadPoolExecutor(max_workers=READ_THREADS, thread_name_prefix="db-read")
+
+    def _migrate(self) -> None:
+        """
+        Bring tables created by an older version up to date: add missing nullable columns and indexes.
+        """
+        inspector = inspect(self.engine)
+        with self.engine.begin() as connection:
+            # Validators for conditional requests moved to the HTTP cache backend, which bounds their size
+            connection.exec_driver_sql("DROP TABLE IF EXISTS httpcacheentry")
+            release_indexes = {index["name"] for index in inspector.get_indexes("release")}
+            if "ix_release_node_id" not in release_indexes:
+                # Releases stored before node_id was unique may be duplicated; keep the first copy
+                first_copies = select(func.min(Release.id)).group_by(Release.node_id)
+                connection.execute(delete(Release).where(col(Release.id).not_in(first_copies)))
+            added: set[tuple[str, str]] = set()
+            for table in SQLModel.metadata.sorted_tables:
+                existing = {column["name"] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing or not column.nullable:
+                        continue
+                    column_type = column.type.compile(dialect=self.engine.dialect)
+                    connection.exec_driver_sql(
+                        f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                    )
+                    logger.info("Added column %s.%s", table.name, column.name)
+                    added.add((table.name, column.name))
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
+            if ("release", "repository_id") in added:
+                # Link releases stored before repository_id existed back to their repository. Compared
+                # with substr rather than LIKE, which treats _ as a wildcard and ignores case
+                prefix = col(Repository.html_url) + "/releases/"
+                connection.execute(
+                    update(Release)
+                    .where(col(Release.repository_id).is_(None))
+                    .values(
+                        repository_id=select(Repository.id)
+                        .where(func.substr(Release.html_url, 1, func.length(prefix)) == prefix)
+                        .scalar_subquery()
+                    )
+                )
+            self._create_search_indexes(connection)
+
+    def _create_search_indexes(self, connection: Connection) -> None:
+        """
+        Create the FTS5 indexes over repositories and releases, along with the triggers that update
+        them on every write. Indexes created for an existing db are filled from its rows.
+        """
+        for table, (index, columns) in SEARCH_INDEXES.items():
+            exists = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (index,)
+            ).first()
+            if exists:
+                continue
+            # Table, index and column names all come from SEARCH_INDEXES, never from user input
+            column_list = ", ".join(columns)
+            new_values = ", ".join(f"new.{column}" for column in columns)
+            old_values = ", ".join(f"old.{column}" for column in columns)
+            delete_old = (
+                f"INSERT INTO {index}({index}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});"  # noqa: S608
+            )
+            insert_new = f"INSERT INTO {index}(rowid, {column_list}) VALUES (new.id, {new_values});"  # noqa: S608
+            connection.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE {index} USING fts5("
+                f"{column_list}, content='{table}', content_rowid='id', tokenize='porter unicode61')"
+            )
+            connection.exec_driver_sql(
+                f'CREATE TRIGGER {index}_insert AFTER INSERT ON "{table}" BEGIN {insert_new} END'
+            )
+            connection.exec_driver_sql(
+                f'CREATE TRIGGER {index}_delete AFTER DELETE ON "{table}" BEGIN {delete_old} END'
+            )
+            connection.exec_driver_sql(
+                f'CREATE TRIGGER {index}_update AFTER UPDATE OF {column_list} ON "{table}" '
+                f"BEGIN {delete_old} {insert_new} END"
+            )
+            connection.exec_driver_sql(f"INSERT INTO {index}({index}) VALUES ('rebuild')")  # noqa: S608
+            logger.info("Created full-text index %s", index)
+
+    async def _read[T](self, func: Callable[..., T], *args: object) -> T:
+        return await get_running_loop().run_in_executor(self._read_executor, partial(func, *args))
+
+    async def _write[T](self, func: Callable[..., T], *args: object) -> T:
+        return await get_running_loop().run_in_executor(self._write_executor, partial(func, *args))
+
+    def close(self) -> None:
+        self._write_executor.shutdown()
+        self._read_executor.shutdown()
+        self.engine.dispose()
 
     def add_user(self, user: User) -> None:
         with Session(self.engine) as session:
@@ -21,22 +258,179 @@ class DbClient:
             session.add(release)
             session.commit()
 
+    def add_releases(self, releases: Sequence[Release]) -> int:
+        """
+        Insert the releases in a single transaction, skipping any that are already stored.
+        Returns the number of new rows.
+        """
+        return len(self.add_new_releases(releases))
+
+    def add_new_releases(self, releases: Sequence[Release]) -> list[Release]:
+        """
+        Insert the releases that aren't stored yet in a single transaction, stamping them with the
+        time they were stored. Returns the new releases.
+        """
+        if not releases:
+            return []
+        table = Release.__table__  # type: ignore[attr-defined]
+        column_names = {column.name for column in table.columns}
+        stored_at = datetime.now(UTC)
+        with Session(self.engine) as session:
+            stored: set[str] = set()
+            node_ids = [release.node_id for release in releases]
+            for start in range(0, len(node_ids), IN_CLAUSE_SIZE):
+                chunk = node_ids[start : start + IN_CLAUSE_SIZE]
+                stored.update(session.exec(select(Release.node_id).where(col(Release.node_id).in_(chunk))))
+            new_releases = []
+            for release in releases:
+                if release.node_id not in stored:
+                    stored.add(release.node_id)
+                    release.stored_at = stored_at
+                    new_releases.append(release)
+            if new_releases:
+                rows = [release.model_dump(include=column_names) for release in new_releases]
+                session.execute(sqlite_insert(table).on_conflict_do_nothing(), rows)
+            session.commit()
+        return new_releases
+
     def add_repository(self, repository: Repository) -> None:
         with Session(self.engine) as session:
             session.add(repository)
             session.commit()
 
+    def upsert_repositories(self, repositories: Sequence[Repository]) -> None:
+        """
+        Insert the repositories, updating rows that already exist, in a single transaction.
+        """
+        if not repositories:
+            return
+        table = Repository.__table__  # type: ignore[attr-defined]
+        column_names = [column.name for column in table.columns]
+        rows = [repo.model_dump(include=set(column_names)) for repo in repositories]
+        statement = sqlite_insert(table)
+        set_ = {name: statement.excluded[name] for name in column_names if name != "id"}
+        # The repo may have been starred more recently by another user; max() is null if either side is
+        set_["starred_at"] = func.coalesce(
+            func.max(table.c.starred_at, statement.excluded.starred_at),
+            table.c.starred_at,
+            statement.excluded.starred_at,
+        )
+        statement = statement.on_conflict_do_update(index_elements=[table.c.id], set_=set_)
+        with Session(self.engine) as session:
+            # executemany with one row of parameters per execution keeps us clear of
+            # SQLite's bound-parameter limit, whatever the number of repositories
+            session.execute(statement, rows)
+            session.commit()
+
+    def upsert_stars(self, stars: Sequence[Star]) -> None:
+        """
+        Insert the stars, updating the starred_at of those that already exist.
+        """
+        if not stars:
+            return
+        table = Star.__table__  # type: ignore[attr-defined]
+        statement = sqlite_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.repository_id],
+            set_={"starred_at": statement.excluded.starred_at},
+        )
+        with Session(self.engine) as session:
+            session.execute(statement, [star.model_dump() for star in stars])
+            session.commit()
+
+    def delete_stars_except(self, user_id: int, repository_ids: set[int]) -> int:
+        """
+        Delete the user's stars on every repo but the given ones, i.e. the repos they unstarred.
+        Returns the number of stars deleted.
+        """
+        with Session(self.engine) as session:
+            starred = set(session.exec(select(Star.repository_id).where(Star.user_id == user_id)))
+            unstarred = list(starred - repository_ids)
+            for start in range(0, len(unstarred), IN_CLAUSE_SIZE):
+                chunk = unstarred[start : start + IN_CLAUSE_SIZE]
+                session.execute(
+                    delete(Star).where(col(Star.user_id) == user_id).where(col(Star.repository_id).in_(chunk))
+                )
+            session.commit()
+        return len(unstarred)
+
     def update_repository(self, repository: Repository) -> None:
         with Session(self.engine) as session:
             session.add(repository)
             session.commit()
             session.refresh(repository)
 
-    def get_releases(self, start_time: datetime) -> Sequence[Release]:
+    def _page_releases(
+        self,
+        statement: Any,
+        start_time: datetime,
+        end_time: datetime | None,
+        limit: int | None,
+        cursor: tuple[datetime, int] | None,
+        user_id: int | None,
+    ) -> Any:
+        if user_id is not None:
+            statement = statement.join(
+                Star, (Star.repository_id == Release.repository_id) & (Star.user_id == user_id)
+            )
+        statement = statement.where(Release.created_at > start_time)
+        if end_time is not None:
+            statement = statement.where(Release.created_at <= end_time)
+        if cursor is not None:
+            statement = statement.where(tuple_(Release.created_at, Release.id) < tuple_(*cursor))
+        return statement.order_by(col(Release.created_at).desc(), col(Release.id).desc()).limit(limit)
+
+    def get_releases(
+        self,
+        start_time: datetime,
+        end_time: datetime | None = None,
+        limit: int | None = None,
+        cursor: tuple[datetime, int] | None = None,
+        user_id: int | None = None,
+    ) -> Sequence[Release]:
+        """
+        Returns releases created in (start_time, end_time], newest first, of the repos starred by the
+        given user or by anyone. The cursor is the (created_at, id) of the last release of the previous page.
+        """
         with Session(self.engine) as session:
-            statement = select(Release).where(Release.created_at > start_time)
+            statement = self._page_releases(select(Release), start_time, end_time, limit, cursor, user_id)
             results = session.exec(statement)
-            return results.all()
+            return results.all()  # type: ignore[no-any-return]
+
+    def get_releases_stored_after(
+        self, cursor: tuple[datetime, int] | None, limit: int | None = None, user_id: int | None = None
+    ) -> Sequence[Release]:
+        """
+        Returns releases in the order they were stored, starting after the (stored_at, id) cursor, of
+        the repos starred by the given user or by anyone.
+        """
+        with Session(self.engine) as session:
+            statement = select(Release).where(Release.stored_at != None)  # noqa: E711
+            if user_id is not None:
+                statement = statement.join(
+                    Star,
+                    (col(Star.repository_id) == col(Release.repository_id)) & (col(Star.user_id) == user_id),
+                )
+            if cursor is not None:
+                statement = statement.where(tuple_(Release.stored_at, Release.id) > tuple_(*cursor))
+            statement = statement.order_by(col(Release.stored_at), col(Release.id)).limit(limit)
+            return session.exec(statement).all()
+
+    def get_release_summaries(
+        self,
+        start_time: datetime,
+        end_time: datetime | None = None,
+        limit: int | None = None,
+        cursor: tuple[datetime, int] | None = None,
+        user_id: int | None = None,
+    ) -> list[ReleaseSummary]:
+        """
+        Same as get_releases, but only the ReleaseSummary columns are read.
+        """
+        columns = [getattr(Release, name) for name in ReleaseSummary.model_fields]
+        with Session(self.engine) as session:
+            statement = self._page_releases(select(*columns), start_time, end_time, limit, cursor, user_id)
+            return [ReleaseSummary(**row._mapping) for row in session.execute(statement)]
 
     def get_repository(self, repo_id: int) -> Repository:
         with Session(self.engine) as session:
@@ -44,11 +438,102 @@ class DbClient:
             results = session.exec(statement)
             return results.one()
 
-    def get_starred_repos(self) -> Sequence[Repository]:
+    def _page_starred_repos(
+        self,
+        statement: Any,
+        since: str | None,
+        until: str | None,
+        limit: int | None,
+        cursor: tuple[str, int] | None,
+        user_id: int | None,
+    ) -> Any:
+        if user_id is not None:
+            statement = statement.join(Star, Star.repository_id == Repository.id).where(
+                Star.user_id == user_id
+            )
+        # Repos stored before starred_at was tracked sort last
+        starred_at = func.coalesce(Star.starred_at if user_id is not None else Repository.starred_at, "")
+        if since is not None:
+            statement = statement.where(starred_at > since)
+        if until is not None:
+            statement = statement.where(starred_at <= until)
+        if cursor is not None:
+            statement = statement.where(tuple_(starred_at, Repository.id) < tuple_(*cursor))
+        return statement.order_by(starred_at.desc(), col(Repository.id).desc()).limit(limit)
+
+    def get_starred_repos(
+        self,
+        since: str | None = None,
+        until: str | None = None,
+        limit: int | None = None,
+        cursor: tuple[str, int] | None = None,
+        user_id: int | None = None,
+    ) -> Sequence[Repository]:
+        """
+        Returns starred repositories, most recently starred first, optionally starred in (since, until].
+        With a user, only that user's stars are returned, with the time that user starred them.
+        The cursor is the (starred_at, id) of the last repository of the previous page.
+        """
         with Session(self.engine) as session:
-            statement = select(Repository)
-            results = session.exec(statement)
-            return results.all()
+            if user_id is None:
+                statement = self._page_starred_repos(select(Repository), since, until, limit, cursor, None)
+                return session.exec(statement).all()  # type: ignore[no-any-return]
+            statement = self._page_starred_repos(
+                select(Repository, Star.starred_at), since, until, limit, cursor, user_id
+            )
+            rows = session.exec(statement).all()
+            # Detach the repos first, so the per-user starred_at is never written back
+            session.expunge_all()
+        repos = []
+        for repo, starred_at in rows:
+            repo.starred_at = starred_at
+            repos.append(repo)
+        return repos
+
+    def get_starred_repo_summaries(
+        self,
+        since: str | None = None,
+        until: str | None = None,
+        limit: int | None = None,
+        cursor: tuple[str, int] | None = None,
+        user_id: int | None = None,
+    ) -> list[RepositorySummary]:
+        """
+        Same as get_starred_repos, but only the RepositorySummary columns are read.
+        """
+        columns = [
+            Star.starred_at if name == "starred_at" and user_id is not None else getattr(Repository, name)
+            for name in RepositorySummary.model_fields
+        ]
+        with Session(self.engine) as session:
+            statement = self._page_starred_repos(select(*columns), since, until, limit, cursor, user_id)
+            return [RepositorySummary(**row._mapping) for row in session.execute(statement)]
+
+    def get_latest_starred_at(self, user_id: int | None = None) -> str | None:
+        with Session(self.engine) as session:
+            if user_id is None:
+                statement = select(func.max(Repository.starred_at))
+            else:
+                statement = select(func.max(Star.starred_at)).where(Star.user_id == user_id)
+            return session.exec(statement).one()
+
+    def get_starred_repo_ids(self, user_id: int) -> set[int]:
+        with Session(self.engine) as session:
+            statement = select(Star.repository_id).where(Star.user_id == user_id)
+            return set(session.exec(statement))
+
+    def get_stargazers(self, repo_ids: Sequence[int]) -> dict[int, set[int]]:
+        """
+        The ids of the users who starred each of the given repos, for repos with any stars.
+        """
+        stargazers: dict[int, set[int]] = {}
+        with Session(self.engine) as session:
+            for start in range(0, len(repo_ids), IN_CLAUSE_SIZE):
+                chunk = repo_ids[start : start + IN_CLAUSE_SIZE]
+                statement = select(Star.repository_id, Star.user_id).where(col(Star.repository_id).in_(chunk))
+                for repository_id, user_id in session.exec(statement):
+                    stargazers.setdefault(repository_id, set()).add(user_id)
+        return stargazers
 
     def get_updated_repos(self, start_date: datetime) -> Sequence[Repository]:
         with Session(self.engine) as session:
@@ -60,15 +545,184 @@ class DbClient:
             results = session.exec(statement)
             return results.all()
 
+    def get_repos_by_full_name(self, full_names: Iterable[str]) -> Sequence[Repository]:
+        with Session(self.engine) as session:
+            statement = select(Repository).where(Repository.full_name.in_(list(full_names)))  # type: ignore[attr-defined]
+            return session.exec(statement).all()
+
+    def read_arrow(self, model: type[SQLModel], columns: Sequence[str] | None = None) -> pa.Table:
+        """
+        Read whole columns of a table into an Arrow table, without building model instances.
+        """
+        table = model.__table__  # type: ignore[attr-defined]
+        selected = [table.c[name] for name in columns] if columns is not None else list(table.columns)
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(*selected)).all()
+        values = list(zip(*rows, strict=True)) if rows else [() for _ in selected]
+        return pa.table(
+            {
+                column.name: pa.array(column_values, type=_arrow_type(column.type))
+                for column, column_values in zip(selected, values, strict=True)
+            }
+        )
+
+    def load_arrow(self, model: type[SQLModel], table: pa.Table, batch_size: int = 10_000) -> int:
+        """
+        Insert the rows of an Arrow table in a single transaction, skipping rows whose key is already stored.
+        Columns of the Arrow table that the db table doesn't have are ignored. Returns the number of new rows.
+        """
+        db_table = model.__table__  # type: ignore[attr-defined]
+        table = table.select([name for name in table.column_names if name in db_table.c])
+        statement = sqlite_insert(db_table).on_conflict_do_nothing()
+        inserted = 0
+        with Session(self.engine) as session:
+            for batch in table.to_batches(max_chunksize=batch_size):
+                result = session.execute(statement, batch.to_pylist())
+                inserted += result.rowcount  # type: ignore[attr-defined]
+            session.commit()
+        return inserted
+
+    def search(
+        self,
+        query: str,
+        kinds: Sequence[Literal["repository", "release"]] = ("repository", "release"),
+        limit: int = 20,
+        offset: int = 0,
+        user_id: int | None = None,
+    ) -> list[SearchResult]:
+        """
+        Full-text search of starred repos and release notes, limited to the repos starred by the given
+        user if any. bm25 scores from different indexes can't be compared, so results are ranked within
+        each kind and the kinds are interleaved: best repository, best release, second best repository...
+        """
+        match = _match_expression(query)
+        if not match or not kinds:
+            return []
+        statement = text(
+            # Only the fixed SEARCH_QUERIES are joined in, the search itself is bound
+            "SELECT kind, id, title, html_url, snippet, rank FROM ("  # noqa: S608
+            " SELECT *, row_number() OVER (PARTITION BY kind ORDER BY rank, id) AS position FROM ("
+            + " UNION ALL ".join(SEARCH_QUERIES[kind] for kind in kinds)
+            # Repositories go before releases of the same position
+            + ")) ORDER BY position, kind = 'release' LIMIT :limit OFFSET :offset"
+        )
+        parameters = {
+            "query": match,
+            "limit": limit,
+            "offset": offset,
+            "user_id": user_id,
+            "mark_start": SNIPPET_MARK_START,
+            "mark_end": SNIPPET_MARK_END,
+        }
+        with self.engine.connect() as connection:
+            rows = connection.execute(statement, parameters)
+            return [
+                SearchResult.model_validate(dict(row._mapping) | {"snippet": _highlight(row.snippet)})
+                for row in rows
+            ]
+
     def store_run(self, timestamp: datetime) -> None:
         with Session(self.engine) as session:
             session.add(RunData(executed_at=timestamp))
             session.commit()
 
     def get_last_run(self) -> RunData | None:
-        # FIXME: This should order by executed_at and return the most recent RunData
         with Session(self.engine) as session:
-            statement = select(RunData).order_by(RunData.executed_at.isoformat())
+            statement = select(RunData).order_by(RunData.executed_at.desc())  # type: ignore[attr-defined]
             results = session.exec(statement)
             data = results.first()
             return data
+
+    async def add_releases_async(self, releases: Sequence[Release]) -> int:
+        return await self._write(self.add_releases, releases)
+
+    async def add_new_releases_async(self, releases: Sequence[Release]) -> list[Release]:
+        return await self._write(self.add_new_releases, releases)
+
+    async def upsert_repositories_async(self, repositories: Sequence[Repository]) -> None:
+        await self._write(self.upsert_repositories, repositories)
+
+    async def upsert_stars_async(self, stars: Sequence[Star]) -> None:
+        await self._write(self.upsert_stars, stars)
+
+    async def delete_stars_except_async(self, user_id: int, repository_ids: set[int]) -> int:
+        return await self._write(self.delete_stars_except, user_id, repository_ids)
+
+    async def store_run_async(self, timestamp: datetime) -> None:
+        await self._write(self.store_run, timestamp)
+
+    async def get_releases_stored_after_async(
+        self, cursor: tuple[datetime, int] | None, limit: int | None = None, user_id: int | None = None
+    ) -> Sequence[Release]:
+        return await self._read(self.get_releases_stored_after, cursor, limit, user_id)
+
+    async def get_releases_async(
+        self,
+        start_time: datetime,
+        end_time: datetime | None = None,
+        limit: int | None = None,
+        cursor: tuple[datetime, int] | None = None,
+        user_id: int | None = None,
+    ) -> Sequence[Release]:
+        return await self._read(self.get_releases, start_time, end_time, limit, cursor, user_id)
+
+    async def get_starred_repos_async(
+        self,
+        since: str | None = None,
+        until: str | None = None,
+        limit: int | None = None,
+        cursor: tuple[str, int] | None = None,
+        user_id: int | None = None,
+    ) -> Sequence[Repository]:
+        return await self._read(self.get_starred_repos, since, until, limit, cursor, user_id)
+
+    async def get_release_summaries_async(
+        self,
+        start_time: datetime,
+        end_time: datetime | None = None,
+        limit: int | None = None,
+        cursor: tuple[datetime, int] | None = None,
+        user_id: int | None = None,
+    ) -> list[ReleaseSummary]:
+        return await self._read(self.get_release_summaries, start_time, end_time, limit, cursor, user_id)
+
+    async def get_starred_repo_summaries_async(
+        self,
+        since: str | None = None,
+        until: str | None = None,
+        limit: int | None = None,
+        cursor: tuple[str, int] | None = None,
+        user_id: int | None = None,
+    ) -> list[RepositorySummary]:
+        return await self._read(self.get_starred_repo_summaries, since, until, limit, cursor, user_id)
+
+    async def get_latest_starred_at_async(self, user_id: int | None = None) -> str | None:
+        return await self._read(self.get_latest_starred_at, user_id)
+
+    async def get_starred_repo_ids_async(self, user_id: int) -> set[int]:
+        return await self._read(self.get_starred_repo_ids, user_id)
+
+    async def get_stargazers_async(self, repo_ids: Sequence[int]) -> dict[int, set[int]]:
+        return await self._read(self.get_stargazers, repo_ids)
+
+    async def get_updated_repos_async(self, start_date: datetime) -> Sequence[Repository]:
+        return await self._read(self.get_updated_repos, start_date)
+
+    async def get_repos_by_full_name_async(self, full_names: Iterable[str]) -> Sequence[Repository]:
+        return await self._read(self.get_repos_by_full_name, full_names)
+
+    async def read_arrow_async(self, model: type[SQLModel], columns: Sequence[str] | None = None) -> pa.Table:
+        return await self._read(self.read_arrow, model, columns)
+
+    async def search_async(
+        self,
+        query: str,
+        kinds: Sequence[Literal["repository", "release"]] = ("repository", "release"),
+        limit: int = 20,
+        offset: int = 0,
+        user_id: int | None = None,
+    ) -> list[SearchResult]:
+        return await self._read(self.search, query, kinds, limit, offset, user_id)
+
+    async def get_last_run_async(self) -> RunData | None:
+        return await self._read(self.get_last_run)
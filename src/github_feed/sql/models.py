@@ -1,11 +1,14 @@
 from datetime import datetime
 from enum import Enum
 from functools import cached_property
+from typing import Literal
 from zoneinfo import ZoneInfo
 
 from pydantic import EmailStr, computed_field
 from sqlmodel import Field, SQLModel
 
+LOCAL_TZ = ZoneInfo("America/Phoenix")
+
 
 class RunData(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
@@ -18,15 +21,18 @@ class Release(SQLModel, table=True):
     assets_url: str
     tarball_url: str
     zipball_url: str
-    node_id: str
+    node_id: str = Field(unique=True, index=True)
     tag_name: str
     target_commitish: str
     name: str | None = None
     body: str
     draft: bool = False
     prelease: bool = False
-    created_at: datetime
+    created_at: datetime = Field(index=True)
     published_at: datetime
+    repository_id: int | None = Field(default=None, foreign_key="repository.id", index=True)
+    # When the feed first stored the release, which orders the live release stream
+    stored_at: datetime | None = Field(default=None, index=True)
 
     @computed_field  # type: ignore[prop-decorator]
     @cached_property
@@ -34,7 +40,7 @@ class Release(SQLModel, table=True):
         """
         Convert the created_at field to a local timezone-aware datetime object.
         """
-        return self.created_at.astimezone(ZoneInfo("America/Phoenix"))
+        return self.created_at.astimezone(LOCAL_TZ)
 
     @computed_field  # type: ignore[prop-decorator]
     @cached_property
@@ -42,7 +48,20 @@ class Release(SQLModel, table=True):
         """
         Convert the published_at field to a local timezone-aware datetime object.
         """
-        return self.published_at.astimezone(ZoneInfo("America/Phoenix"))
+        return self.published_at.astimezone(LOCAL_TZ)
+
+
+class ReleaseSummary(SQLModel):
+    """
+    List view of a release, without the body and other detail columns.
+    """
+
+    id: int
+    name: str | None = None
+    tag_name: str
+    created_at: datetime
+    html_url: str
+    repository_id: int | None = None
 
 
 class User(SQLModel, table=True):
@@ -165,10 +184,50 @@ class Repository(SQLModel, table=True):
     visibility: str | None = Field(
         "public", description="The repository visibility: public, private, or internal."
     )
-    pushed_at: datetime | None = None
+    pushed_at: datetime | None = Field(default=None, index=True)
     created_at: datetime | None = None
     updated_at: datetime | None = None
     open_issues: int
     watchers: int
     master_branch: str | None = None
+    # Most recent time any user served by the instance starred the repository
+    starred_at: str | None = None
+
+
+class Star(SQLModel, table=True):
+    """
+    A user's star on a repository. Users are identified by their GitHub user id.
+    """
+
+    user_id: int = Field(primary_key=True)
+    repository_id: int = Field(primary_key=True, foreign_key="repository.id", index=True)
+    starred_at: str | None = Field(default=None, index=True)
+
+
+class RepositorySummary(SQLModel):
+    """
+    List view of a starred repository, without the API URL templates and other detail columns.
+    """
+
+    id: int
+    full_name: str
+    description: str | None = None
+    stargazers_count: int
+    language: str | None = None
+    pushed_at: datetime | None = None
     starred_at: str | None = None
+
+
+class SearchResult(SQLModel):
+    """
+    Starred repository or release matching a full-text search.
+    """
+
+    kind: Literal["repository", "release"]
+    id: int
+    title: str
+    html_url: str
+    # Best matching fragment, HTML-escaped, with the matched terms wrapped in <mark> tags
+    snippet: str
+    # bm25 score, lower is a better match; only comparable between results of the same kind
+    rank: float
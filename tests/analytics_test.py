@@ -0,0 +1,77 @@
+from datetime import UTC, date, datetime, timedelta
+
+from conftest import make_release, make_repository
+
+from github_feed.analytics import Analytics
+from github_feed.sql.client import DbClient
+from github_feed.sql.models import Star
+
+
+def make_db() -> DbClient:
+    db = DbClient("sqlite://")
+    db.upsert_repositories(
+        [
+            make_repository(1, full_name="astral-sh/ruff", language="Rust"),
+            make_repository(2, full_name="astral-sh/uv", language="Rust"),
+            make_repository(3, full_name="pydantic/pydantic", language="Python"),
+        ]
+    )
+    # Monday 2025-01-06: ruff releases every day, uv every other day, pydantic once
+    start = datetime(2025, 1, 6, tzinfo=UTC)
+    releases = [make_release(day, start + timedelta(days=day), repository_id=1) for day in range(4)]
+    releases += [make_release(10 + day, start + timedelta(days=day), repository_id=2) for day in (0, 2, 4)]
+    releases.append(make_release(20, start + timedelta(days=8), repository_id=3))
+    db.add_releases(releases)
+    return db
+
+
+def test_aggregates_over_snapshot() -> None:
+    analytics = Analytics(make_db())
+    since = datetime(2025, 1, 1, tzinfo=UTC)
+
+    per_language = analytics.releases_per_language(since)
+    assert [(row.week, row.language, row.releases) for row in per_language] == [
+        (date(2025, 1, 6), "Rust", 7),
+        (date(2025, 1, 13), "Python", 1),
+    ]
+
+    owners = analytics.most_active_owners(since, limit=10)
+    assert [(row.owner, row.repos, row.releases) for row in owners] == [
+        ("astral-sh", 2, 7),
+        ("pydantic", 1, 1),
+    ]
+
+    cadence = analytics.release_cadence(since, limit=10)
+    assert [(row.full_name, row.releases, row.median_days_between) for row in cadence] == [
+        ("astral-sh/ruff", 4, 1.0),
+        ("astral-sh/uv", 3, 2.0),
+    ]
+
+
+def test_aggregates_are_limited_to_a_users_stars() -> None:
+    db = make_db()
+    db.upsert_stars(
+        [Star(user_id=1, repository_id=1), Star(user_id=1, repository_id=3), Star(user_id=2, repository_id=2)]
+    )
+    analytics = Analytics(db)
+    since = datetime(2025, 1, 1, tzinfo=UTC)
+
+    per_language = analytics.releases_per_language(since, user_id=1)
+    assert [(row.language, row.releases) for row in per_language] == [("Rust", 4), ("Python", 1)]
+    owners = analytics.most_active_owners(since, limit=10, user_id=2)
+    assert [(row.owner, row.repos, row.releases) for row in owners] == [("astral-sh", 1, 3)]
+    cadence = analytics.release_cadence(since, limit=10, user_id=1)
+    assert [row.full_name for row in cadence] == ["astral-sh/ruff"]
+
+
+def test_snapshot_is_reloaded_after_invalidate() -> None:
+    db = make_db()
+    analytics = Analytics(db)
+    since = datetime(2025, 1, 1, tzinfo=UTC)
+    assert analytics.most_active_owners(since, limit=1)[0].releases == 7
+
+    db.add_releases([make_release(30, datetime(2025, 1, 20, tzinfo=UTC), repository_id=3)])
+    assert analytics.most_active_owners(since, limit=1)[0].releases == 7
+    analytics.invalidate()
+    owners = analytics.most_active_owners(since, limit=10)
+    assert [(row.owner, row.releases) for row in owners] == [("astral-sh", 7), ("pydantic", 2)]
@@ -0,0 +1,25 @@
+import pytest
+from conftest import make_release
+
+from github_feed.broker import ReleaseBroker
+
+
+@pytest.mark.enable_socket
+async def test_published_releases_reach_every_subscriber() -> None:
+    broker = ReleaseBroker()
+    with broker.subscribe() as first, broker.subscribe() as second:
+        broker.publish([make_release(1)])
+        assert [release.id for release in await first.get() or []] == [1]
+        assert [release.id for release in await second.get() or []] == [1]
+    broker.publish([make_release(2)])
+    assert first._queue.empty()
+
+
+@pytest.mark.enable_socket
+async def test_slow_subscriber_is_dropped() -> None:
+    broker = ReleaseBroker(max_pending=2)
+    with broker.subscribe() as subscription:
+        for release_id in range(3):
+            broker.publish([make_release(release_id)])
+        assert subscription.dropped
+        assert await subscription.get() is None
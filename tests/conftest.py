@@ -0,0 +1,82 @@
+from datetime import UTC, datetime, timedelta
+
+from github_feed.sql.models import Release, Repository
+
+
+def make_repository(repo_id: int, **overrides: object) -> Repository:
+    name = f"repo-{repo_id}"
+    fields: dict[str, object] = {
+        "id": repo_id,
+        "node_id": f"node-{repo_id}",
+        "name": name,
+        "full_name": f"octocat/{name}",
+        "forks": 0,
+        "private": False,
+        "html_url": f"https://github.com/octocat/{name}",
+        "fork": False,
+        "language": "Python",
+        "forks_count": 0,
+        "stargazers_count": 1,
+        "watchers_count": 1,
+        "size": 1,
+        "default_branch": "main",
+        "open_issues_count": 0,
+        "has_issues": True,
+        "has_pages": False,
+        "has_downloads": True,
+        "archived": False,
+        "disabled": False,
+        "pushed_at": datetime(2025, 1, 1, tzinfo=UTC),
+        "open_issues": 0,
+        "watchers": 1,
+    }
+    for url_field in (
+        "assignees_url",
+        "blobs_url",
+        "branches_url",
+        "collaborators_url",
+        "comments_url",
+        "commits_url",
+        "compare_url",
+        "contents_url",
+        "git_commits_url",
+        "git_refs_url",
+        "git_tags_url",
+        "git_url",
+        "issue_comment_url",
+        "issue_events_url",
+        "issues_url",
+        "keys_url",
+        "labels_url",
+        "milestones_url",
+        "notifications_url",
+        "pulls_url",
+        "releases_url",
+        "ssh_url",
+        "statuses_url",
+        "trees_url",
+    ):
+        fields[url_field] = f"https://api.github.com/repos/octocat/{name}/{url_field}"
+    fields.update(overrides)
+    return Repository(**fields)
+
+
+def make_release(release_id: int, created_at: datetime | None = None, **overrides: object) -> Release:
+    if created_at is None:
+        # One release a day from 2025-01-01
+        created_at = datetime(2025, 1, 1, tzinfo=UTC) + timedelta(days=release_id - 1)
+    fields: dict[str, object] = {
+        "id": release_id,
+        "html_url": f"https://github.com/octocat/Hello-World/releases/tag/v{release_id}",
+        "assets_url": f"https://api.github.com/repos/octocat/Hello-World/releases/{release_id}/assets",
+        "tarball_url": f"https://api.github.com/repos/octocat/Hello-World/tarball/v{release_id}",
+        "zipball_url": f"https://api.github.com/repos/octocat/Hello-World/zipball/v{release_id}",
+        "node_id": f"release-node-{release_id}",
+        "tag_name": f"v{release_id}",
+        "target_commitish": "main",
+        "body": "",
+        "created_at": created_at,
+        "published_at": created_at,
+    }
+    fields.update(overrides)
+    return Release(**fields)
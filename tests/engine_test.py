@@ -1,18 +1,113 @@
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
 import pytest
+from conftest import make_repository
+from pydantic import TypeAdapter
 
 from github_feed.engine import DEFAULT_DB_FILENAME, Engine
+from github_feed.github_client import AuthenticatedUser, GitHubClient
+from github_feed.lib.models import Release, RepositoryRecord
+from github_feed.sql.models import Star
 
 
 @pytest.mark.parametrize(
     ("db_filename_env_var", "expected_db_filename"), [(None, DEFAULT_DB_FILENAME), ("test.db", "test.db")]
 )
 def test_load_config(
-    monkeypatch: pytest.MonkeyPatch, db_filename_env_var: str | None, expected_db_filename: str
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+    db_filename_env_var: str | None,
+    expected_db_filename: str,
 ) -> None:
+    # Keep the default data/ files out of the working tree
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
     mock_token = "fake_token"  # noqa: S105
     monkeypatch.setenv("GITHUB_TOKEN", mock_token)
+    monkeypatch.setenv("HTTP_CACHE_FILENAME", "")
     if db_filename_env_var is not None:
         monkeypatch.setenv("DB_FILENAME", db_filename_env_var)
     engine = Engine()
     assert engine.config.db_filename == expected_db_filename
     assert engine.config.github_token.get_secret_value() == mock_token
+
+
+@pytest.mark.enable_socket
+async def test_releases_are_fetched_with_a_stargazers_token(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setenv("GITHUB_TOKEN", "owner-token")
+    monkeypatch.setenv("DB_FILENAME", str(tmp_path / "test.db"))
+    monkeypatch.setenv("HTTP_CACHE_FILENAME", "")
+    engine = Engine()
+    engine.gh_client._user = AuthenticatedUser(1, "owner")
+    for user_id, login in ((2, "alice"), (3, "bob")):
+        engine.clients.get(f"{login}-token")._user = AuthenticatedUser(user_id, login)
+    pushed_at = datetime.now(UTC)
+    engine.db.upsert_repositories([make_repository(repo_id, pushed_at=pushed_at) for repo_id in (1, 2, 3, 4)])
+    # Repo 4 is only starred by a user without a client in the pool
+    stargazers = {1: (1, 2), 2: (3, 2), 3: (3,), 4: (4,)}
+    engine.db.upsert_stars(
+        [
+            Star(user_id=user_id, repository_id=repo_id)
+            for repo_id, users in stargazers.items()
+            for user_id in users
+        ]
+    )
+    fetched_by: dict[str, list[str]] = {}
+
+    async def get_latest_releases_async(
+        self: GitHubClient, urls: list[str], since: datetime | None = None
+    ) -> list[list[Release] | BaseException]:
+        fetched_by[self.token] = [url.split("/")[5] for url in urls]
+        return [[] for _ in urls]
+
+    monkeypatch.setattr(GitHubClient, "get_latest_releases_async", get_latest_releases_async)
+    await engine.retrieve_fresh_releases_async(pushed_at - timedelta(hours=1))
+    await engine.close()
+
+    assert fetched_by == {
+        "owner-token": ["repo-1", "repo-4"],
+        "alice-token": ["repo-2"],
+        "bob-token": ["repo-3"],
+    }
+
+
+@pytest.mark.enable_socket
+async def test_full_star_refresh_removes_unstarred_repos(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setenv("GITHUB_TOKEN", "owner-token")
+    monkeypatch.setenv("DB_FILENAME", str(tmp_path / "test.db"))
+    monkeypatch.setenv("HTTP_CACHE_FILENAME", "")
+    engine = Engine()
+    engine.gh_client._user = AuthenticatedUser(1, "owner")
+    record_adapter = TypeAdapter(RepositoryRecord)
+    pages: list[list[int]] = []
+    fail_after_pages = False
+
+    async def iter_starred_pages(
+        self: GitHubClient, since: str | None = None
+    ) -> AsyncIterator[list[RepositoryRecord]]:
+        for page in pages:
+            yield [record_adapter.validate_python(make_repository(repo_id).model_dump()) for repo_id in page]
+        if fail_after_pages:
+            raise RuntimeError("A page failed")
+
+    monkeypatch.setattr(GitHubClient, "iter_starred_pages", iter_starred_pages)
+    pages = [[1, 2], [3]]
+    await engine.refresh_starred_repos(full=True)
+    assert engine.db.get_starred_repo_ids(1) == {1, 2, 3}
+
+    pages = [[1], [3]]
+    await engine.refresh_starred_repos(full=True)
+    assert engine.db.get_starred_repo_ids(1) == {1, 3}
+
+    # Without the full listing, a missing repo may just be on a page that failed
+    pages, fail_after_pages = [[1]], True
+    with pytest.raises(RuntimeError):
+        await engine.refresh_starred_repos(full=True)
+    assert engine.db.get_starred_repo_ids(1) == {1, 3}
+    await engine.close()
@@ -0,0 +1,30 @@
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import pyarrow.parquet as pq
+from conftest import make_release, make_repository
+
+from github_feed.export import export_parquet, import_parquet
+from github_feed.sql.client import DbClient
+from github_feed.sql.models import Release, Repository, Star
+
+
+def test_parquet_round_trip(tmp_path: Path) -> None:
+    source = DbClient("sqlite://")
+    source.upsert_repositories([make_repository(repo_id) for repo_id in range(1, 4)])
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    source.add_releases(
+        [make_release(i, start + timedelta(hours=i), repository_id=i % 3 + 1) for i in range(1, 11)]
+    )
+    source.upsert_stars([Star(user_id=user_id, repository_id=1) for user_id in (1, 2)])
+
+    assert export_parquet(source, tmp_path) == {"repository": 3, "release": 10, "user": 0, "star": 2}
+    metadata = pq.ParquetFile(tmp_path / "repository.parquet").metadata
+    assert metadata.row_group(0).column(0).compression == "ZSTD"
+
+    target = DbClient(f"sqlite:///{tmp_path / 'target.db'}")
+    assert import_parquet(target, tmp_path) == {"repository": 3, "release": 10, "user": 0, "star": 2}
+    assert import_parquet(target, tmp_path) == {"repository": 0, "release": 0, "user": 0, "star": 0}
+    assert target.read_arrow(Repository).equals(source.read_arrow(Repository))
+    assert target.read_arrow(Release).equals(source.read_arrow(Release))
+    assert target.read_arrow(Star).equals(source.read_arrow(Star))
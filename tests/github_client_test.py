@@ -0,0 +1,533 @@
+import asyncio
+import json
+import time
+from datetime import UTC, datetime
+from typing import Any
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from multidict import CIMultiDict, CIMultiDictProxy
+
+from github_feed import github_client
+from github_feed.github_client import GitHubClient, GitHubClientPool, RequestScheduler
+from github_feed.http_cache import MemoryCacheBackend
+
+RELEASES = [
+    {
+        "id": 1,
+        "html_url": "https://github.com/octocat/Hello-World/releases/tag/v1.0.0",
+        "assets_url": "https://api.github.com/repos/octocat/Hello-World/releases/1/assets",
+        "tarball_url": "https://api.github.com/repos/octocat/Hello-World/tarball/v1.0.0",
+        "zipball_url": "https://api.github.com/repos/octocat/Hello-World/zipball/v1.0.0",
+        "node_id": "MDc6UmVsZWFzZTE=",
+        "tag_name": "v1.0.0",
+        "target_commitish": "master",
+        "name": "v1.0.0",
+        "body": "Description of the release",
+        "draft": False,
+        "prelease": False,
+        "created_at": "2013-02-27T19:35:32Z",
+        "published_at": "2013-02-27T19:35:32Z",
+    }
+]
+
+
+def repository_payload(repo_id: int) -> dict[str, object]:
+    name = f"repo-{repo_id}"
+    api_url = f"https://api.github.com/repos/octocat/{name}"
+    payload: dict[str, object] = {
+        "id": repo_id,
+        "node_id": f"node-{repo_id}",
+        "name": name,
+        "full_name": f"octocat/{name}",
+        "license": None,
+        "forks": 0,
+        "owner": {
+            "login": "octocat",
+            "id": 1,
+            "node_id": "MDQ6VXNlcjE=",
+            "avatar_url": "https://github.com/images/error/octocat_happy.gif",
+            "url": "https://api.github.com/users/octocat",
+            "html_url": "https://github.com/octocat",
+            "followers_url": "https://api.github.com/users/octocat/followers",
+            "following_url": "https://api.github.com/users/octocat/following{/other_user}",
+            "gists_url": "https://api.github.com/users/octocat/gists{/gist_id}",
+            "starred_url": "https://api.github.com/users/octocat/starred{/owner}{/repo}",
+            "subscriptions_url": "https://api.github.com/users/octocat/subscriptions",
+            "organizations_url": "https://api.github.com/users/octocat/orgs",
+            "repos_url": "https://api.github.com/users/octocat/repos",
+            "events_url": "https://api.github.com/users/octocat/events{/privacy}",
+            "received_events_url": "https://api.github.com/users/octocat/received_events",
+            "type": "User",
+            "site_admin": False,
+        },
+        "private": False,
+        "html_url": f"https://github.com/octocat/{name}",
+        "description": None,
+        "fork": False,
+        "url": api_url,
+        "mirror_url": None,
+        "homepage": None,
+        "language": "Python",
+        "forks_count": 0,
+        "stargazers_count": 1,
+        "watchers_count": 1,
+        "size": 1,
+        "default_branch": "main",
+        "open_issues_count": 0,
+        "has_issues": True,
+        "has_projects": True,
+        "has_wiki": True,
+        "has_pages": False,
+        "has_downloads": True,
+        "archived": False,
+        "disabled": False,
+        "pushed_at": "2025-01-01T00:00:00Z",
+        "created_at": "2020-01-01T00:00:00Z",
+        "updated_at": "2025-01-01T00:00:00Z",
+        "open_issues": 0,
+        "watchers": 1,
+        "git_url": f"git://github.com/octocat/{name}.git",
+        "ssh_url": f"git@github.com:octocat/{name}.git",
+        "clone_url": f"https://github.com/octocat/{name}.git",
+        "svn_url": f"https://svn.github.com/octocat/{name}",
+        "releases_url": f"{api_url}/releases{{/id}}",
+    }
+    for url_field in (
+        "archive_url",
+        "assignees_url",
+        "blobs_url",
+        "branches_url",
+        "collaborators_url",
+        "comments_url",
+        "commits_url",
+        "compare_url",
+        "contents_url",
+        "contributors_url",
+        "deployments_url",
+        "downloads_url",
+        "events_url",
+        "forks_url",
+        "git_commits_url",
+        "git_refs_url",
+        "git_tags_url",
+        "hooks_url",
+        "issue_comment_url",
+        "issue_events_url",
+        "issues_url",
+        "keys_url",
+        "labels_url",
+        "languages_url",
+        "merges_url",
+        "milestones_url",
+        "notifications_url",
+        "pulls_url",
+        "stargazers_url",
+        "statuses_url",
+        "subscribers_url",
+        "subscription_url",
+        "tags_url",
+        "teams_url",
+        "trees_url",
+    ):
+        payload[url_field] = f"{api_url}/{url_field.removesuffix('_url')}"
+    return payload
+
+
+def starred_payload(repo_id: int) -> dict[str, object]:
+    return {"starred_at": f"2025-01-{repo_id:02d}T00:00:00Z", "repo": repository_payload(repo_id)}
+
+
+@pytest.mark.enable_socket
+async def test_incremental_starred_sync_stops_at_known_star() -> None:
+    # Ten stars, newest first, served two per page
+    stars = [starred_payload(repo_id) for repo_id in range(10, 0, -1)]
+    requested_pages: list[int] = []
+
+    async def starred(request: web.Request) -> web.Response:
+        page = int(request.query.get("page", "1"))
+        requested_pages.append(page)
+        base = str(request.url.with_query({"per_page": "2"}))
+        headers = {"Link": f'<{base}&page={page + 1}>; rel="next", <{base}&page=5>; rel="last"'}
+        return web.json_response(stars[(page - 1) * 2 : page * 2], headers=headers)
+
+    app = web.Application()
+    app.router.add_get("/user/starred", starred)
+    async with TestServer(app, host="127.0.0.1") as server:
+        client = GitHubClient("fake_token", base_url=str(server.make_url("")).rstrip("/"))
+        repos = await client.get_starred_repositories_async(since="2025-01-07T00:00:00Z")
+        await client.close()
+
+    assert [repo.id for repo in repos] == [10, 9, 8]
+    assert repos[0].starred_at == "2025-01-10T00:00:00Z"
+    assert requested_pages == [1, 2]
+
+
+@pytest.mark.enable_socket
+async def test_full_starred_sync_yields_each_page() -> None:
+    stars = [starred_payload(repo_id) for repo_id in range(6, 0, -1)]
+
+    async def starred(request: web.Request) -> web.Response:
+        page = int(request.query.get("page", "1"))
+        base = str(request.url.with_query({"per_page": "2"}))
+        headers = {"Link": f'<{base}&page={page + 1}>; rel="next", <{base}&page=3>; rel="last"'}
+        return web.json_response(stars[(page - 1) * 2 : page * 2], headers=headers)
+
+    app = web.Application()
+    app.router.add_get("/user/starred", starred)
+    async with TestServer(app, host="127.0.0.1") as server:
+        client = GitHubClient("fake_token", base_url=str(server.make_url("")).rstrip("/"))
+        pages = [[repo.id for repo in page] async for page in client.iter_starred_pages()]
+        await client.close()
+
+    assert pages[0] == [6, 5]
+    assert sorted(pages[1:]) == [[2, 1], [4, 3]]
+
+
+@pytest.mark.enable_socket
+async def test_conditional_get_reuses_stored_payload() -> None:
+    seen_validators: list[str | None] = []
+
+    async def releases(request: web.Request) -> web.Response:
+        seen_validators.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.json_response(RELEASES, headers={"ETag": '"v1"'})
+
+    app = web.Application()
+    app.router.add_get("/releases", releases)
+    async with TestServer(app, host="127.0.0.1") as server:
+        client = GitHubClient("fake_token")
+        url = str(server.make_url("/releases"))
+
+        session = await client.open()
+        first = await client._conditional_get(url)
+        second = await client._conditional_get(url)
+        assert await client.open() is session
+        await client.close()
+
+    assert seen_validators == [None, '"v1"']
+    assert not first.not_modified
+    assert second.not_modified
+    assert json.loads(second.payload) == RELEASES
+
+
+@pytest.mark.enable_socket
+async def test_not_modified_pages_keep_their_link_header(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Starred pages are not served from the response cache, so every page is requested again
+    monkeypatch.setattr(github_client, "STARRED_CACHE_TTL", 0)
+    stars = [starred_payload(repo_id) for repo_id in range(4, 0, -1)]
+    not_modified = 0
+
+    async def starred(request: web.Request) -> web.Response:
+        nonlocal not_modified
+        page = int(request.query.get("page", "1"))
+        etag = f'"page-{page}"'
+        if request.headers.get("If-None-Match") == etag:
+            # Like GitHub's, these 304s carry no Link header
+            not_modified += 1
+            return web.Response(status=304)
+        base = str(request.url.with_query({"per_page": "2"}))
+        headers = {"ETag": etag, "Link": f'<{base}&page={page + 1}>; rel="next", <{base}&page=2>; rel="last"'}
+        return web.json_response(stars[(page - 1) * 2 : page * 2], headers=headers)
+
+    app = web.Application()
+    app.router.add_get("/user/starred", starred)
+    async with TestServer(app, host="127.0.0.1") as server:
+        client = GitHubClient("fake_token", base_url=str(server.make_url("")).rstrip("/"))
+        first = await client.get_starred_repositories_async()
+        second = await client.get_starred_repositories_async()
+        incremental = await client.get_starred_repositories_async(since="2025-01-01T00:00:00Z")
+        await client.close()
+
+    assert sorted(repo.id for repo in first) == [1, 2, 3, 4]
+    assert sorted(repo.id for repo in second) == [1, 2, 3, 4]
+    assert [repo.id for repo in incremental] == [4, 3, 2]
+    # The incremental sync follows the next link, whose page 2 URL the full syncs did not request
+    assert not_modified == 3
+
+
+@pytest.mark.enable_socket
+async def test_conditional_requests_are_scoped_to_the_token() -> None:
+    seen_validators: list[str | None] = []
+
+    async def starred(request: web.Request) -> web.Response:
+        etag = f'"{request.headers["Authorization"]}"'
+        seen_validators.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        return web.json_response([], headers={"ETag": etag})
+
+    app = web.Application()
+    app.router.add_get("/user/starred", starred)
+    async with TestServer(app, host="127.0.0.1") as server:
+        cache = MemoryCacheBackend()
+        alice, bob = GitHubClient("alice", cache=cache), GitHubClient("bob", cache=cache)
+        url = str(server.make_url("/user/starred"))
+        await alice._conditional_get(url)
+        await bob._conditional_get(url)
+        assert (await alice._conditional_get(url)).not_modified
+        assert (await bob._conditional_get(url)).not_modified
+        await alice.close()
+        await bob.close()
+
+    assert seen_validators == [None, None, '"Bearer alice"', '"Bearer bob"']
+
+
+@pytest.mark.enable_socket
+async def test_rate_limited_request_is_retried() -> None:
+    attempts = 0
+
+    async def releases(request: web.Request) -> web.Response:
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            return web.Response(status=429, headers={"Retry-After": "0"})
+        return web.json_response(RELEASES)
+
+    app = web.Application()
+    app.router.add_get("/releases", releases)
+    async with TestServer(app, host="127.0.0.1") as server:
+        client = GitHubClient("fake_token", scheduler=RequestScheduler(backoff_base=0.01))
+        response = await client._conditional_get(str(server.make_url("/releases")))
+        await client.close()
+
+    assert attempts == 2
+    assert response.status == 200
+
+
+def test_only_rate_limit_403s_are_retried() -> None:
+    scheduler = RequestScheduler(backoff_base=0.01)
+    rate_limit = {"x-ratelimit-remaining": "4999", "x-ratelimit-reset": "0"}
+    forbidden = CIMultiDictProxy(CIMultiDict(rate_limit))
+    secondary = b'{"message": "You have exceeded a secondary rate limit."}'
+    assert scheduler.retry_delay(403, forbidden, b'{"message": "Resource protected by SAML"}', 0) is None
+    assert scheduler.retry_delay(403, forbidden, secondary, 0) is not None
+
+    http_date = CIMultiDictProxy(CIMultiDict(rate_limit | {"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}))
+    delay = scheduler.retry_delay(403, http_date, b"", 0)
+    assert delay is not None
+    assert delay < 1
+
+
+@pytest.mark.enable_socket
+async def test_rate_limit_resources_are_paced_separately() -> None:
+    scheduler = RequestScheduler()
+    reset = str(int(time.time()) + 3600)
+    exhausted = {"x-ratelimit-remaining": "0", "x-ratelimit-reset": reset, "x-ratelimit-resource": "graphql"}
+    scheduler.update(CIMultiDictProxy(CIMultiDict(exhausted)), "graphql")
+    scheduler.update(
+        CIMultiDictProxy(CIMultiDict({"x-ratelimit-remaining": "4999", "x-ratelimit-reset": reset}))
+    )
+
+    # An exhausted GraphQL budget does not hold back REST requests
+    async with asyncio.timeout(1), scheduler.slot("core"):
+        pass
+    with pytest.raises(TimeoutError):
+        async with asyncio.timeout(0.1), scheduler.slot("graphql"):
+            pass
+
+
+def release_payload(release_id: int, created_at: str) -> dict[str, object]:
+    return RELEASES[0] | {
+        "id": release_id,
+        "node_id": f"release-node-{release_id}",
+        "tag_name": f"v{release_id}",
+        "created_at": created_at,
+        "published_at": created_at,
+    }
+
+
+@pytest.mark.enable_socket
+async def test_release_pages_are_followed_only_inside_the_window() -> None:
+    # Six releases, one per day and newest first, served two per page
+    releases = [release_payload(day, f"2025-01-{day:02d}T00:00:00Z") for day in range(6, 0, -1)]
+    requested_pages: list[int] = []
+
+    async def list_releases(request: web.Request) -> web.Response:
+        page = int(request.query.get("page", "1"))
+        requested_pages.append(page)
+        next_url = request.url.with_query({"per_page": "2", "page": str(page + 1)})
+        return web.json_response(
+            releases[(page - 1) * 2 : page * 2], headers={"Link": f'<{next_url}>; rel="next"'}
+        )
+
+    app = web.Application()
+    app.router.add_get("/repos/octocat/Hello-World/releases", list_releases)
+    async with TestServer(app, host="127.0.0.1") as server:
+        client = GitHubClient("fake_token")
+        releases_url = str(server.make_url("/repos/octocat/Hello-World/releases")) + "{/id}"
+        [result] = await client.get_latest_releases_async(
+            [releases_url], since=datetime(2025, 1, 3, 12, tzinfo=UTC)
+        )
+        # A narrower window is answered from the cached fetch, a wider one is fetched again
+        [narrower] = await client.get_latest_releases_async(
+            [releases_url], since=datetime(2025, 1, 4, 12, tzinfo=UTC)
+        )
+        [wider] = await client.get_latest_releases_async(
+            [releases_url], since=datetime(2025, 1, 1, 12, tzinfo=UTC)
+        )
+        await client.close()
+
+    assert not isinstance(result, BaseException)
+    assert [release.tag_name for release in result] == ["v6", "v5", "v4", "v3"]
+    assert not isinstance(narrower, BaseException)
+    assert [release.tag_name for release in narrower] == ["v6", "v5"]
+    assert not isinstance(wider, BaseException)
+    assert [release.tag_name for release in wider][-1] == "v1"
+    assert requested_pages == [1, 2, 1, 2, 3]
+
+
+@pytest.mark.enable_socket
+async def test_first_page_is_only_reused_for_windows_it_covers() -> None:
+    releases = [release_payload(day, f"2025-01-{day:02d}T00:00:00Z") for day in range(6, 0, -1)]
+    requested_pages: list[int] = []
+
+    async def list_releases(request: web.Request) -> web.Response:
+        page = int(request.query.get("page", "1"))
+        requested_pages.append(page)
+        next_url = request.url.with_query({"per_page": "2", "page": str(page + 1)})
+        return web.json_response(
+            releases[(page - 1) * 2 : page * 2], headers={"Link": f'<{next_url}>; rel="next"'}
+        )
+
+    app = web.Application()
+    app.router.add_get("/repos/octocat/Hello-World/releases", list_releases)
+    async with TestServer(app, host="127.0.0.1") as server:
+        client = GitHubClient("fake_token")
+        releases_url = str(server.make_url("/repos/octocat/Hello-World/releases")) + "{/id}"
+        [first_page] = await client.get_latest_releases_async([releases_url])
+        [covered] = await client.get_latest_releases_async(
+            [releases_url], since=datetime(2025, 1, 5, 12, tzinfo=UTC)
+        )
+        [wider] = await client.get_latest_releases_async(
+            [releases_url], since=datetime(2025, 1, 3, 12, tzinfo=UTC)
+        )
+        await client.close()
+
+    assert not isinstance(first_page, BaseException)
+    assert [release.tag_name for release in first_page] == ["v6", "v5"]
+    assert not isinstance(covered, BaseException)
+    assert [release.tag_name for release in covered] == ["v6"]
+    assert not isinstance(wider, BaseException)
+    assert [release.tag_name for release in wider] == ["v6", "v5", "v4", "v3"]
+    assert requested_pages == [1, 1, 2]
+
+
+@pytest.mark.enable_socket
+async def test_graphql_batches_repositories_into_aliased_queries(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(github_client, "GRAPHQL_NODE_BUDGET", 200)
+    queries: list[dict[str, Any]] = []
+
+    async def graphql(request: web.Request) -> web.Response:
+        body = await request.json()
+        queries.append(body)
+        data: dict[str, object] = {"rateLimit": {"cost": 1, "remaining": 4999}}
+        for key, name in body["variables"].items():
+            if not key.startswith("n"):
+                continue
+            alias = f"r{key[1:]}"
+            if name == "missing":
+                data[alias] = None
+                continue
+            node = {
+                "databaseId": 1,
+                "id": f"node-{name}",
+                "url": f"https://github.com/octocat/{name}/releases/tag/v1.0.0",
+                "tagName": "v1.0.0",
+                "name": "v1.0.0",
+                "description": None,
+                "isDraft": False,
+                "isPrerelease": False,
+                "createdAt": "2025-01-01T00:00:00Z",
+                "publishedAt": None,
+                "tagCommit": {"oid": "abc123"},
+            }
+            data[alias] = {"releases": {"nodes": [node]}}
+        return web.json_response({"data": data})
+
+    app = web.Application()
+    app.router.add_post("/graphql", graphql)
+    async with TestServer(app, host="127.0.0.1") as server:
+        base_url = str(server.make_url("")).rstrip("/")
+        client = GitHubClient("fake_token", base_url=base_url)
+        results = await client.get_releases_graphql(["octocat/a", "octocat/missing", "octocat/b"], first=500)
+        await client.close()
+
+    # 500 releases per repo is capped at GitHub's 100, and a node budget of 200 allows two repos per query
+    assert {query["variables"]["first"] for query in queries} == {100}
+    assert sorted(len(query["variables"]) - 1 for query in queries) == [2, 4]
+    first, missing, last = results
+    assert isinstance(first, list)
+    assert first[0].node_id == "node-a"
+    assert first[0].target_commitish == "abc123"
+    assert first[0].published_at == first[0].created_at
+    assert isinstance(missing, BaseException)
+    assert isinstance(last, list)
+    assert last[0].html_url == "https://github.com/octocat/b/releases/tag/v1.0.0"
+    assert last[0].assets_url.startswith(f"{base_url}/repos/octocat/b/")
+
+
+def event_payload(event_id: int, event_type: str, repo_name: str, created_at: str) -> dict[str, object]:
+    return {
+        "id": str(event_id),
+        "type": event_type,
+        "repo": {"id": event_id, "name": repo_name},
+        "created_at": created_at,
+    }
+
+
+@pytest.mark.enable_socket
+async def test_release_event_repos_respect_poll_interval() -> None:
+    events = [
+        event_payload(3, "ReleaseEvent", "octocat/Hello-World", "2025-01-03T00:00:00Z"),
+        event_payload(2, "PushEvent", "octocat/Spoon-Knife", "2025-01-02T00:00:00Z"),
+        event_payload(1, "ReleaseEvent", "octocat/linguist", "2025-01-01T00:00:00Z"),
+    ]
+    polls = 0
+
+    async def user(request: web.Request) -> web.Response:
+        return web.json_response({"id": 583231, "login": "octocat"})
+
+    async def received_events(request: web.Request) -> web.Response:
+        nonlocal polls
+        polls += 1
+        return web.json_response(events, headers={"X-Poll-Interval": "60", "ETag": '"e1"'})
+
+    app = web.Application()
+    app.router.add_get("/user", user)
+    app.router.add_get("/users/octocat/received_events", received_events)
+    async with TestServer(app, host="127.0.0.1") as server:
+        client = GitHubClient("fake_token", base_url=str(server.make_url("")).rstrip("/"))
+        first = await client.get_release_event_repos(datetime(2025, 1, 1, 12, tzinfo=UTC))
+        second = await client.get_release_event_repos(datetime(2024, 12, 31, tzinfo=UTC))
+        await client.close()
+
+    assert first == {"octocat/Hello-World"}
+    assert second == {"octocat/Hello-World", "octocat/linguist"}
+    assert polls == 1
+
+
+@pytest.mark.enable_socket
+async def test_client_pool_evicts_least_recently_used(monkeypatch: pytest.MonkeyPatch) -> None:
+    pool = GitHubClientPool(max_clients=2)
+    first = pool.get("token-1")
+    await first.open()
+    second = pool.get("token-2")
+    pool.get("token-3")
+    assert len(pool) == 2
+    # Within the grace period, the evicted client stays open and comes back for its token
+    await pool.close_evicted()
+    assert first._session is not None
+    assert pool.get("token-1") is first
+
+    assert second not in pool.clients()
+    monkeypatch.setattr(github_client, "EVICTED_CLIENT_GRACE", 0)
+    await second.open()
+    await pool.close_evicted()
+    assert second._session is None
+    assert pool.get("token-2") is not second
+    await pool.close()
+    assert len(pool) == 0
+    assert first._session is None
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import pytest
+
+from github_feed.http_cache import MemoryCacheBackend, SqliteCacheBackend
+
+
+@pytest.mark.enable_socket
+async def test_sqlite_cache_is_shared_between_instances(tmp_path: Path) -> None:
+    writer = SqliteCacheBackend(str(tmp_path / "cache.db"))
+    reader = SqliteCacheBackend(str(tmp_path / "cache.db"))
+    await writer.set("fresh", b"payload", ttl=60)
+    await writer.set("stale", b"payload", ttl=-1)
+
+    assert await reader.get("fresh") == b"payload"
+    assert await reader.get("stale") is None
+    assert await reader.get("missing") is None
+    await writer.close()
+    await reader.close()
+
+
+@pytest.mark.enable_socket
+async def test_sqlite_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    cache = SqliteCacheBackend(str(tmp_path / "cache.db"), max_bytes=20)
+    await cache.set("a", b"x" * 10, ttl=60)
+    await cache.set("b", b"x" * 10, ttl=60)
+    assert await cache.get("a") is not None
+    await cache.set("c", b"x" * 10, ttl=60)
+    cache.evict()
+
+    assert await cache.get("a") is not None
+    assert await cache.get("b") is None
+    assert await cache.get("c") is not None
+    await cache.close()
+
+
+@pytest.mark.enable_socket
+async def test_memory_cache_expires_entries() -> None:
+    cache = MemoryCacheBackend()
+    await cache.set("fresh", b"payload", ttl=60)
+    await cache.set("stale", b"payload", ttl=-1)
+
+    assert await cache.get("fresh") == b"payload"
+    assert await cache.get("stale") is None
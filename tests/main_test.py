@@ -0,0 +1,155 @@
+from collections.abc import Iterator
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import pytest
+from conftest import make_release, make_repository
+from fastapi.testclient import TestClient
+
+from github_feed.engine import Engine
+from github_feed.github_client import AuthenticatedUser, GitHubClient, InvalidTokenError
+from github_feed.main import app
+from github_feed.sql.models import Star
+
+# Every test starts the app, whose event loop needs sockets
+pytestmark = pytest.mark.enable_socket
+
+OWNER = AuthenticatedUser(583231, "octocat")
+# Starred by the instance owner, whose view requests without a token get
+OWNER_REPO_ID = 1
+
+
+@pytest.fixture
+def app_env(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """
+    Configure the app to keep its files in tmp_path and not refresh in the background.
+    """
+    monkeypatch.setenv("GITHUB_TOKEN", "fake_token")
+    monkeypatch.setenv("DB_FILENAME", str(tmp_path / "test.db"))
+    monkeypatch.setenv("HTTP_CACHE_FILENAME", str(tmp_path / "http_cache.db"))
+    monkeypatch.setenv("REFRESH_INTERVAL", "0")
+
+
+@pytest.fixture
+def client(app_env: None) -> Iterator[TestClient]:
+    """
+    A client of the started app, whose owner starred OWNER_REPO_ID.
+    """
+    with TestClient(app) as client:
+        engine = app.state.engine
+        engine.gh_client._user = OWNER
+        engine.db.upsert_repositories([make_repository(OWNER_REPO_ID)])
+        engine.db.upsert_stars([Star(user_id=OWNER.id, repository_id=OWNER_REPO_ID)])
+        yield client
+
+
+@pytest.fixture
+def engine(client: TestClient) -> Engine:
+    return app.state.engine  # type: ignore[no-any-return]
+
+
+def test_engine_is_shared_across_requests(monkeypatch: pytest.MonkeyPatch, app_env: None) -> None:
+    inits = 0
+    original_init = Engine.__init__
+
+    def counting_init(self: Engine) -> None:
+        nonlocal inits
+        inits += 1
+        original_init(self)
+
+    monkeypatch.setattr(Engine, "__init__", counting_init)
+    with TestClient(app) as client:
+        app.state.engine.gh_client._user = OWNER
+        assert client.get("/releases").json() == []
+        assert client.get("/starred").json() == []
+        assert inits == 1
+
+
+def test_releases_are_paged_with_link_header(client: TestClient, engine: Engine) -> None:
+    now = datetime.now(UTC)
+    engine.db.add_releases(
+        [make_release(i, created_at=now - timedelta(hours=i), repository_id=OWNER_REPO_ID) for i in (1, 2, 3)]
+    )
+
+    first = client.get("/releases", params={"limit": 2})
+    assert [release["tag_name"] for release in first.json()] == ["v1", "v2"]
+    second = client.get(first.links["next"]["url"])
+    assert [release["tag_name"] for release in second.json()] == ["v3"]
+    assert "link" not in second.headers
+
+
+def test_releases_are_slim_unless_expanded(client: TestClient, engine: Engine) -> None:
+    engine.db.add_releases([make_release(1, created_at=datetime.now(UTC), repository_id=OWNER_REPO_ID)])
+
+    [summary] = client.get("/releases").json()
+    assert "body" not in summary
+    assert summary["tag_name"] == "v1"
+    [release] = client.get("/releases", params={"expand": "body"}).json()
+    assert release["body"] == ""
+    assert "created_at_local_tz" in release
+
+
+def test_cached_releases_answer_if_none_match(client: TestClient, engine: Engine) -> None:
+    engine.db.add_releases([make_release(1, created_at=datetime.now(UTC), repository_id=OWNER_REPO_ID)])
+
+    engine.db.store_run(datetime.now(UTC) - timedelta(hours=1))
+    first = client.get("/releases")
+    etag = first.headers["etag"]
+    assert "x-last-refreshed" in first.headers
+    assert "age" not in first.headers
+    assert client.get("/releases", headers={"If-None-Match": etag}).status_code == 304
+
+    # Not visible until the cache is invalidated, as a refresh that stores releases does
+    engine.db.add_releases([make_release(2, created_at=datetime.now(UTC), repository_id=OWNER_REPO_ID)])
+    assert len(client.get("/releases").json()) == 1
+    engine.response_cache.invalidate()
+    refreshed = client.get("/releases", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert len(refreshed.json()) == 2
+
+
+def test_requests_without_a_token_get_the_owners_view(
+    monkeypatch: pytest.MonkeyPatch, client: TestClient, engine: Engine
+) -> None:
+    # A private repo starred by a pooled user only
+    engine.db.upsert_repositories([make_repository(2, private=True)])
+    engine.db.upsert_stars([Star(user_id=1, repository_id=2)])
+    now = datetime.now(UTC)
+    engine.db.add_releases(
+        [
+            make_release(1, created_at=now, repository_id=OWNER_REPO_ID),
+            make_release(2, created_at=now, repository_id=2),
+        ]
+    )
+
+    assert [repo["id"] for repo in client.get("/starred").json()] == [OWNER_REPO_ID]
+    assert [release["id"] for release in client.get("/releases").json()] == [1]
+    assert [result["id"] for result in client.get("/search", params={"q": "v1"}).json()] == [1]
+    assert client.get("/search", params={"q": "v2"}).json() == []
+    [owner] = client.get("/analytics/owners").json()
+    assert owner["repos"] == 1
+
+    engine.gh_client._user = None
+    monkeypatch.setattr(engine.gh_client, "get_authenticated_user", failing_lookup)
+    engine.response_cache.invalidate()
+    assert client.get("/releases").status_code == 503
+
+
+async def failing_lookup() -> AuthenticatedUser:
+    raise RuntimeError("GitHub is down")
+
+
+def test_only_rejected_tokens_are_unauthorized(
+    monkeypatch: pytest.MonkeyPatch, client: TestClient, engine: Engine
+) -> None:
+
+    async def get_authenticated_user(self: GitHubClient) -> AuthenticatedUser:
+        if self.token == "rejected":  # noqa: S105
+            raise InvalidTokenError("Bad credentials")
+        raise RuntimeError("GitHub is down")
+
+    monkeypatch.setattr(GitHubClient, "get_authenticated_user", get_authenticated_user)
+    assert client.get("/releases", headers={"Authorization": "Bearer rejected"}).status_code == 401
+    assert len(engine.clients) == 0
+    assert client.get("/releases", headers={"Authorization": "Bearer valid"}).status_code == 503
+    assert len(engine.clients) == 1
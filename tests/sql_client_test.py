@@ -0,0 +1,206 @@
+from datetime import UTC, datetime
+from pathlib import Path
+
+import pytest
+from conftest import make_release, make_repository
+from sqlalchemy import MetaData, Table, create_engine
+
+from github_feed.sql.client import DbClient, SqliteProfile
+from github_feed.sql.models import Release, Repository, Star
+
+
+def test_upsert_repositories_inserts_and_updates() -> None:
+    db = DbClient("sqlite://")
+    db.upsert_repositories([make_repository(i) for i in range(1, 1001)])
+    db.upsert_repositories([make_repository(1, stargazers_count=99, description="updated")])
+
+    repos = db.get_starred_repos()
+    assert len(repos) == 1000
+    updated = db.get_repository(1)
+    assert updated.stargazers_count == 99
+    assert updated.description == "updated"
+
+
+def test_add_releases_ignores_duplicates() -> None:
+    db = DbClient("sqlite://")
+    assert db.add_releases([make_release(1), make_release(2)]) == 2
+    assert db.add_releases([make_release(2), make_release(3)]) == 1
+    assert len(db.get_releases(datetime(2024, 1, 1, tzinfo=UTC))) == 3
+
+
+def test_get_last_run_returns_most_recent_run() -> None:
+    db = DbClient("sqlite://")
+    assert db.get_last_run() is None
+    for day in (2, 3, 1):
+        db.store_run(datetime(2025, 1, day, tzinfo=UTC))
+    last_run = db.get_last_run()
+    assert last_run is not None
+    assert last_run.executed_at.day == 3
+
+
+# The event loop needs a socketpair for its self-pipe
+@pytest.mark.enable_socket
+async def test_async_interface_runs_off_the_event_loop() -> None:
+    db = DbClient("sqlite://")
+    assert await db.add_releases_async([make_release(1), make_release(2)]) == 2
+    releases = await db.get_releases_async(datetime(2024, 1, 1, tzinfo=UTC))
+    assert {release.tag_name for release in releases} == {"v1", "v2"}
+    db.close()
+
+
+def test_profile_is_applied_to_connections(tmp_path: Path) -> None:
+    db = DbClient(f"sqlite:///{tmp_path / 'test.db'}", profile=SqliteProfile(busy_timeout=1234))
+    with db.engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 1234
+    db.close()
+
+
+def test_get_releases_is_ordered_and_paged() -> None:
+    db = DbClient("sqlite://")
+    db.add_releases([make_release(day) for day in (3, 1, 4, 2)])
+    start_time = datetime(2024, 1, 1, tzinfo=UTC)
+    first_page = db.get_releases(start_time, limit=2)
+    assert [release.tag_name for release in first_page] == ["v4", "v3"]
+    last = first_page[-1]
+    assert last.id is not None
+    second_page = db.get_releases(start_time, limit=2, cursor=(last.created_at, last.id))
+    assert [release.tag_name for release in second_page] == ["v2", "v1"]
+
+
+def test_migration_links_releases_to_repositories(tmp_path: Path) -> None:
+    db_url = f"sqlite:///{tmp_path / 'test.db'}"
+    # Tables from before releases had a repository_id
+    engine = create_engine(db_url)
+    columns = [column._copy() for column in Release.__table__.columns if column.name != "repository_id"]  # type: ignore[attr-defined]
+    legacy_release = Table("release", MetaData(), *columns)
+    legacy_release.create(engine)
+    Repository.__table__.create(engine)  # type: ignore[attr-defined]
+    repos = [
+        make_repository(7, html_url="https://github.com/octocat/hello_world"),
+        make_repository(8, html_url="https://github.com/octocat/hello-world"),
+    ]
+    release = make_release(1)
+    release.html_url = "https://github.com/octocat/hello-world/releases/tag/v1"
+    with engine.begin() as connection:
+        connection.execute(Repository.__table__.insert(), [repo.model_dump() for repo in repos])  # type: ignore[attr-defined]
+        connection.execute(legacy_release.insert(), [release.model_dump(exclude={"repository_id"})])
+    engine.dispose()
+
+    db = DbClient(db_url)
+    [release] = db.get_releases(datetime(2024, 1, 1, tzinfo=UTC))
+    assert release.repository_id == 8
+    db.close()
+
+
+def test_migration_makes_release_node_id_unique(tmp_path: Path) -> None:
+    db_url = f"sqlite:///{tmp_path / 'test.db'}"
+    db = DbClient(db_url)
+    db.add_releases([make_release(1)])
+    # A database from before node_id was unique, holding the same release twice
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX ix_release_node_id")
+    duplicate = make_release(1)
+    duplicate.id = 101
+    db.add_release(duplicate)
+    db.close()
+
+    db = DbClient(db_url)
+    assert [release.id for release in db.get_releases(datetime(2024, 1, 1, tzinfo=UTC))] == [1]
+    assert db.add_releases([make_release(1)]) == 0
+    with db.engine.connect() as connection:
+        indexes = connection.exec_driver_sql("PRAGMA index_list('release')").fetchall()
+        assert any(index[1] == "ix_release_node_id" and index[2] == 1 for index in indexes)
+    db.close()
+
+
+def test_search_is_ranked_and_follows_writes() -> None:
+    db = DbClient("sqlite://")
+    db.upsert_repositories(
+        [
+            make_repository(1, full_name="octocat/parser", description="A fast parser"),
+            make_repository(2, description="Uses a parser internally"),
+        ]
+    )
+    db.add_releases(
+        [
+            make_release(1, body="Fixed crash when parsing empty files <img src=x onerror=alert(1)>"),
+            make_release(2, name="Faster parser"),
+        ]
+    )
+
+    # Ranked within each kind, and the kinds interleaved
+    results = db.search("parser")
+    assert [(result.kind, result.id) for result in results] == [
+        ("repository", 1),
+        ("release", 2),
+        ("repository", 2),
+    ]
+    assert "<mark>parser</mark>" in results[2].snippet
+    # Text around the matches is escaped, as it comes from third-party release notes
+    [result] = db.search("crash")
+    assert result.snippet.startswith("Fixed <mark>crash</mark>")
+    assert "&lt;img src=x onerror=alert(1)&gt;" in result.snippet
+    # Porter stemming matches parsing to parser's stem
+    assert [(result.kind, result.id) for result in db.search("parsing", kinds=["release"])] == [
+        ("release", 1)
+    ]
+    assert db.search('empty "files') != []
+
+    db.upsert_repositories([make_repository(2, description="Nothing to see")])
+    assert [(result.kind, result.id) for result in db.search("parser")] == [("repository", 1), ("release", 2)]
+
+
+def test_new_releases_are_stamped_and_streamed_in_stored_order() -> None:
+    db = DbClient("sqlite://")
+    first = db.add_new_releases([make_release(2), make_release(1)])
+    assert [release.id for release in first] == [2, 1]
+    second = db.add_new_releases([make_release(1), make_release(3)])
+    assert [release.id for release in second] == [3]
+    assert second[0].stored_at is not None
+    assert first[0].stored_at is not None
+    assert first[0].stored_at < second[0].stored_at
+
+    assert [release.id for release in db.get_releases_stored_after(None)] == [1, 2, 3]
+    assert [release.id for release in db.get_releases_stored_after((first[0].stored_at, 1))] == [2, 3]
+
+
+def test_stars_give_each_user_their_own_view() -> None:
+    db = DbClient("sqlite://")
+    db.upsert_repositories([make_repository(1), make_repository(2)])
+    db.upsert_stars(
+        [
+            Star(user_id=10, repository_id=1, starred_at="2025-01-01T00:00:00Z"),
+            Star(user_id=10, repository_id=2, starred_at="2025-01-02T00:00:00Z"),
+            Star(user_id=20, repository_id=2, starred_at="2025-01-05T00:00:00Z"),
+        ]
+    )
+    for release_id, repository_id in ((1, 1), (2, 2)):
+        release = make_release(release_id)
+        release.repository_id = repository_id
+        db.add_releases([release])
+
+    assert [repo.id for repo in db.get_starred_repos(user_id=10)] == [2, 1]
+    [repo] = db.get_starred_repos(user_id=20)
+    assert repo.starred_at == "2025-01-05T00:00:00Z"
+    assert [summary.id for summary in db.get_starred_repo_summaries(user_id=20)] == [2]
+    assert db.get_latest_starred_at(user_id=10) == "2025-01-02T00:00:00Z"
+    # The per-user starred_at is not written back to the repository
+    assert db.get_repository(2).starred_at is None
+
+    start_time = datetime(2024, 1, 1, tzinfo=UTC)
+    assert [release.id for release in db.get_releases(start_time, user_id=10)] == [2, 1]
+    assert [release.id for release in db.get_release_summaries(start_time, user_id=20)] == [2]
+    assert len(db.get_releases(start_time)) == 2
+    assert [result.id for result in db.search("repo", kinds=["repository"], user_id=20)] == [2]
+    assert [release.id for release in db.get_releases_stored_after(None, user_id=20)] == [2]
+
+
+def test_repository_starred_at_keeps_the_latest_star() -> None:
+    db = DbClient("sqlite://")
+    db.upsert_repositories([make_repository(1, starred_at="2025-01-05T00:00:00Z")])
+    db.upsert_repositories([make_repository(1, starred_at="2025-01-01T00:00:00Z")])
+    assert db.get_repository(1).starred_at == "2025-01-05T00:00:00Z"
+    db.upsert_repositories([make_repository(1, starred_at="2025-01-09T00:00:00Z")])
+    assert db.get_repository(1).starred_at == "2025-01-09T00:00:00Z"